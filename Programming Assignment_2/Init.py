@@ -6,7 +6,12 @@ import numpy as np
 import os
 
 scenario = 27
-trajectory_file = "Trajectory_Data.txt"
+trajectory_file = "Trajectory_Data.txt"  # A .npy file name writes the binary trajectory format, and .trz the compressed one
+trajectory_index = False  # True also writes a sidecar index (<trajectory_file>.idx.npy) so a text trajectory can be read by character or time
+trajectory_thread = True  # Format and write the trajectory on a background thread while the simulation steps
+trajectory_tolerance = 1e-3  # Largest error a .trz trajectory may store a float with; 0 keeps float32 precision
+trajectory_chunk_steps = 64  # Timesteps per compressed block of a .trz trajectory
+profile_file = None  # File for a step-time profile of the run (.json or .csv); None runs without profiling
 
 # Scenario  Description
 #     1     Seek and Flee; Seek orbits stationary target
@@ -60,6 +65,8 @@ SWIRL = 14
 # General movement parameters and working variables
 Time = 0
 stop_velocity = 0.02
+crowd_engine = True  # True to step all characters in one vectorized update, False for per-character updates
+random_seed = 330  # Seed of every character's random stream; a run with the same seed repeats exactly
 
 # Initialize generic character
 character0 = {
@@ -93,48 +100,229 @@ character0 = {
     "wander_orientation": 0,
     "path_to_follow": 0,
     "path_offset": 0,
+    "path_segment": -1,  # Path segment closest to the character on the last step; -1 before the first
+    "path_window": 2,  # Segments searched on each side of path_segment; 0 searches the whole path every step
     "sep_decay": 0,
     "sep_threshold": 0,
     "swirl_scale": np.array([0, 0], dtype=np.float64)
 }
 
+# Copy a character, giving the copy its own arrays; a plain dict copy would share the position,
+# velocity and linear arrays that dynamic_update writes into in place.
+def copyCharacter(character):
+    return {key: value.copy() if isinstance(value, np.ndarray) else value for key, value in character.items()}
+
 # Initialize scenario-specific variables, including characters, targets, and paths.
-if (scenario == 27):
+# Returns the scenario's settings; every call builds fresh characters, so runs never share state.
+def init_scenario(scenario):
     import math
 
-    # Create character instances
-    character__01 = character0.copy()
-    character__01['id'] = 2701
-    character__01['steer'] = FOLLOW_PATH
-    character__01['position'] = np.array([20, 95], dtype=np.float64)
-    character__01['max_velocity'] = 4
-    character__01['max_linear'] = 2
-    character__01['path_to_follow'] = 1
-    character__01['path_offset'] = 0.04
-
-
-    # Combine characters into a list
-    Character = [character__01]
-    characters_count = 1
-
-    path_1 = createPath(1, [0,-20,20,-40,40,-60,60,0], [90,65,40,15,-10,-35,-60,-85])
-    Path = [path_1]
-    paths_count = 1
-
-    # Other parameters
-    physics = False  # True for HS physics, False for NE1 integration
-    delta_time = 0.50  # Duration of time step
-    stop_time = 125  # Time of last time step
-    check_collisions = False
-
-    # Plot parameters
-    plot_what = {
-        "position": True,
-        "velocity": True,
-        "linear": True,
-        "orientation": False,
-        "paths": True,
-        "collisions": False
+    Path = []
+    seed = random_seed
+
+    if (scenario == 14):
+        # Create character instances; a 4 x 4 block of characters packed closer than sep_threshold
+        Character = []
+        for row in range(4):
+            for column in range(4):
+                character = copyCharacter(character0)
+                character['id'] = 1401 + 4 * row + column
+                character['steer'] = SEPARATE
+                character['position'] = np.array([-6 + 4 * column, -6 + 4 * row], dtype=np.float64)
+                character['max_velocity'] = 3
+                character['max_linear'] = 2
+                character['sep_threshold'] = 10
+                character['sep_decay'] = 50
+                Character.append(character)
+
+        # Other parameters
+        physics = False  # True for HS physics, False for NE1 integration
+        delta_time = 0.50  # Duration of time step
+        stop_time = 30  # Time of last time step
+        check_collisions = False
+
+        # Plot parameters
+        plot_what = {
+            "position": True,
+            "velocity": True,
+            "linear": True,
+            "orientation": False,
+            "paths": False,
+            "collisions": False
+        }
+        plot_cross_refs = False
+
+    elif (scenario == 24):
+        # Create character instances
+        character_24_01 = copyCharacter(character0)
+        character_24_01['id'] = 2401
+        character_24_01['steer'] = WANDER
+        character_24_01['position'] = np.array([-30, -30], dtype=np.float64)
+        character_24_01['orientation'] = math.pi / 4
+        character_24_01['max_velocity'] = 4
+        character_24_01['max_linear'] = 2
+        character_24_01['max_rotation'] = 1
+        character_24_01['max_angular'] = 2
+        character_24_01['align_radius'] = 0.02
+        character_24_01['align_slow'] = 0.5
+        character_24_01['align_time'] = 0.5
+        character_24_01['wander_offset'] = 8
+        character_24_01['wander_radius'] = 4
+        character_24_01['wander_rate'] = 1
+
+        character_24_02 = copyCharacter(character_24_01)
+        character_24_02['id'] = 2402
+        character_24_02['position'] = np.array([30, -30], dtype=np.float64)
+        character_24_02['orientation'] = 3 * math.pi / 4
+        character_24_02['wander_rate'] = 2
+
+        character_24_03 = copyCharacter(character_24_01)
+        character_24_03['id'] = 2403
+        character_24_03['position'] = np.array([0, 30], dtype=np.float64)
+        character_24_03['orientation'] = 3 * math.pi / 2
+        character_24_03['wander_offset'] = 4
+        character_24_03['wander_radius'] = 8
+
+        # Combine characters into a list
+        Character = [character_24_01, character_24_02, character_24_03]
+
+        # Other parameters
+        physics = False  # True for HS physics, False for NE1 integration
+        delta_time = 0.50  # Duration of time step
+        stop_time = 100  # Time of last time step
+        check_collisions = False
+
+        # Plot parameters
+        plot_what = {
+            "position": True,
+            "velocity": True,
+            "linear": True,
+            "orientation": False,
+            "paths": False,
+            "collisions": False
+        }
+        plot_cross_refs = True
+
+    elif (scenario == 26):
+        # Create character instances
+        character_26_01 = copyCharacter(character0)
+        character_26_01['id'] = 2601
+        character_26_01['steer'] = CONTINUE
+
+        character_26_02 = copyCharacter(character0)
+        character_26_02['id'] = 2602
+        character_26_02['steer'] = FLEE
+        character_26_02['position'] = np.array([-30, -50], dtype=np.float64)
+        character_26_02['velocity'] = np.array([2, 7], dtype=np.float64)
+        character_26_02['orientation'] = math.pi / 4
+        character_26_02['max_velocity'] = 8
+        character_26_02['max_linear'] = 1.5
+        character_26_02['target'] = character_26_01
+
+        character_26_03 = copyCharacter(character0)
+        character_26_03['id'] = 2603
+        character_26_03['steer'] = SEEK
+        character_26_03['position'] = np.array([-50, 40], dtype=np.float64)
+        character_26_03['velocity'] = np.array([0, 8], dtype=np.float64)
+        character_26_03['orientation'] = (3 * math.pi) / 2
+        character_26_03['max_velocity'] = 8
+        character_26_03['max_linear'] = 2
+        character_26_03['target'] = character_26_01
+
+        character_26_04 = copyCharacter(character0)
+        character_26_04['id'] = 2604
+        character_26_04['steer'] = ARRIVE
+        character_26_04['position'] = np.array([50, 75], dtype=np.float64)
+        character_26_04['velocity'] = np.array([-9, 4], dtype=np.float64)
+        character_26_04['orientation'] = math.pi
+        character_26_04['max_velocity'] = 10
+        character_26_04['max_linear'] = 2
+        character_26_04['target'] = character_26_01
+        character_26_04['arrive_radius'] = 4
+        character_26_04['arrive_slow'] = 32
+        character_26_04['arrive_time'] = 1
+
+        # Combine characters into a list
+        Character = [character_26_01, character_26_02, character_26_03, character_26_04]
+
+        # Other parameters
+        physics = False  # True for HS physics, False for NE1 integration
+        delta_time = 0.50  # Duration of time step
+        stop_time = 50  # Time of last time step
+        check_collisions = False
+
+        # Plot parameters
+        plot_what = {
+            "position": True,
+            "velocity": True,
+            "linear": True,
+            "orientation": False,
+            "paths": False,
+            "collisions": False
+        }
+        plot_cross_refs = True
+
+    elif (scenario == 27):
+        # Create character instances
+        character__01 = copyCharacter(character0)
+        character__01['id'] = 2701
+        character__01['steer'] = FOLLOW_PATH
+        character__01['position'] = np.array([20, 95], dtype=np.float64)
+        character__01['max_velocity'] = 4
+        character__01['max_linear'] = 2
+        character__01['path_to_follow'] = 1
+        character__01['path_offset'] = 0.04
+
+
+        # Combine characters into a list
+        Character = [character__01]
+
+        path_1 = createPath(1, [0,-20,20,-40,40,-60,60,0], [90,65,40,15,-10,-35,-60,-85])
+        Path = [path_1]
+
+        # Other parameters
+        physics = False  # True for HS physics, False for NE1 integration
+        delta_time = 0.50  # Duration of time step
+        stop_time = 125  # Time of last time step
+        check_collisions = False
+
+        # Plot parameters
+        plot_what = {
+            "position": True,
+            "velocity": True,
+            "linear": True,
+            "orientation": False,
+            "paths": True,
+            "collisions": False
+        }
+        plot_cross_refs = True
+
+    else:
+        raise ValueError(f"scenario {scenario} has no character data")
+
+    return {
+        "scenario": scenario,
+        "Character": Character,
+        "Path": Path,
+        "physics": physics,
+        "delta_time": delta_time,
+        "stop_time": stop_time,
+        "check_collisions": check_collisions,
+        "seed": seed,
+        "plot_what": plot_what,
+        "plot_cross_refs": plot_cross_refs
     }
-    plot_cross_refs = True
 
+
+# Settings of the selected scenario, for move.py and plotter.py.
+settings = init_scenario(scenario)
+Character = settings["Character"]
+characters_count = len(Character)
+Path = settings["Path"]
+paths_count = len(Path)
+physics = settings["physics"]
+delta_time = settings["delta_time"]
+stop_time = settings["stop_time"]
+check_collisions = settings["check_collisions"]
+plot_what = settings["plot_what"]
+plot_cross_refs = settings["plot_cross_refs"]
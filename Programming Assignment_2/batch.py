@@ -0,0 +1,70 @@
+# Author: Isaiah Harville
+# Purpose: Run many scenarios, or parameter variants of them, in parallel worker processes.
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Init import init_scenario
+from move import run_simulation
+
+
+# Apply a variant's overrides to a scenario's settings. Keys naming a setting (delta_time,
+# stop_time, physics, check_collisions) replace it; any other key is a character field,
+# such as max_linear, and is set on every character.
+def apply_variant(settings, overrides):
+    for key, value in overrides.items():
+        if key in settings:
+            settings[key] = value
+        else:
+            for character in settings['Character']:
+                character[key] = value
+
+    return settings
+
+
+# Simulate one run in a worker process and time it.
+def run_one(run):
+    scenario, overrides, trajectory_file = run
+
+    start = time.perf_counter()
+    settings = apply_variant(init_scenario(scenario), overrides)
+    run_simulation(settings, trajectory_file)
+    seconds = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "variant": overrides,
+        "trajectory_file": trajectory_file,
+        "characters": len(settings['Character']),
+        "seconds": seconds
+    }
+
+
+# Run each entry of runs in its own worker process; an entry is a scenario number or a
+# (scenario, overrides) pair. Each run writes its own trajectory file in output_dir, and
+# extension picks the trajectory format (".npy" for binary). Returns one result per run, in order.
+def run_batch(runs, output_dir="batch_output", workers=None, extension=".txt"):
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    for k, run in enumerate(runs):
+        scenario, overrides = run if isinstance(run, tuple) else (run, {})
+        trajectory_file = os.path.join(output_dir, f"Trajectory_Data_{scenario}_{k}{extension}")
+        jobs.append((scenario, overrides, trajectory_file))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_one, jobs))
+
+
+if __name__ == "__main__":
+    # Scenario numbers may be given on the command line, e.g. python batch.py 26 27
+    scenarios = [int(arg) for arg in sys.argv[1:]] or [26, 27]
+
+    start = time.perf_counter()
+    results = run_batch(scenarios)
+    total = time.perf_counter() - start
+
+    for result in results:
+        print(f"scenario {result['scenario']:>3}  characters {result['characters']:>6}  {result['seconds']:8.3f} s  {result['trajectory_file']}")
+    print(f"{len(results)} runs in {total:.3f} s")
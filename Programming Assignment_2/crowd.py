@@ -0,0 +1,386 @@
+# Author: Isaiah Harville
+# Purpose: Structure-of-arrays crowd engine; steps every character with one vectorized update.
+
+import heapq
+import numpy as np
+from src import *
+from Init import STOP
+
+# Character fields held by the crowd, grouped by the array type that stores them.
+integer_fields = ["id", "steer", "path_to_follow", "path_segment", "path_window"]
+scalar_fields = ["orientation", "rotation", "angular", "max_velocity", "max_linear", "max_rotation", "max_angular",
+                 "arrive_radius", "arrive_slow", "arrive_time", "align_radius", "align_slow", "align_time",
+                 "max_prediction", "avoid_radius", "col_radius", "col_lookahead", "wander_offset", "wander_radius",
+                 "wander_rate", "wander_orientation", "path_offset", "sep_decay", "sep_threshold"]
+vector_fields = ["position", "velocity", "linear", "swirl_scale"]
+
+
+class Crowd:
+    def __init__(self, count):
+        self.count = count
+
+        for field in integer_fields:
+            setattr(self, field, np.zeros(count, dtype=np.int64))
+        for field in scalar_fields:
+            setattr(self, field, np.zeros(count, dtype=np.float64))
+        for field in vector_fields:
+            setattr(self, field, np.zeros((count, 2), dtype=np.float64))
+
+        self.target = np.full(count, -1, dtype=np.int64) # Index of the target character, -1 for none
+        self.col_collided = np.zeros(count, dtype=bool)
+        self.paths = [] # Paths indexed by path_to_follow - 1
+        self.ensemble = np.zeros(count, dtype=np.int64) # Ensemble member; characters of different members never interact
+        self.random = RandomStreams(0, self.id) # Per-character random streams, keyed by id
+
+        # Scratch arrays reused by update
+        self.scratch_vectors = np.zeros((2, count, 2), dtype=np.float64)
+        self.scratch_scalars = np.zeros((2, count), dtype=np.float64)
+        self.scratch_mask = np.zeros(count, dtype=bool)
+
+
+    # Build a crowd from the list of character dicts and paths created in Init.py, with random
+    # streams from seed.
+    @classmethod
+    def from_characters(cls, characters, paths=None, seed=0):
+        crowd = cls(len(characters))
+        crowd.load(characters)
+        crowd.paths = paths if paths is not None else []
+        crowd.seed(seed)
+        return crowd
+
+
+    # Restart every character's random stream from seed.
+    def seed(self, seed):
+        self.random = RandomStreams(seed, self.id)
+
+
+    # Stack copies of the crowd end to end, one per ensemble member; each copy's targets stay within
+    # that copy, and copies of a character draw the same random numbers. Reshaping a field to (copies, count, ...) gives the ensemble axis as a view.
+    def tile(self, copies):
+        ensemble = Crowd(self.count * copies)
+        for field in integer_fields + scalar_fields + vector_fields + ["col_collided"]:
+            values = getattr(self, field)
+            getattr(ensemble, field)[:] = np.tile(values, (copies,) + (1,) * (values.ndim - 1))
+
+        offsets = np.repeat(np.arange(copies) * self.count, self.count)
+        targets = np.tile(self.target, copies)
+        ensemble.target[:] = np.where(targets >= 0, targets + offsets, -1)
+        ensemble.ensemble[:] = np.repeat(np.arange(copies), self.count)
+        ensemble.paths = self.paths
+        ensemble.seed(self.random.seed)
+        return ensemble
+
+
+    # Read-only views of the crowd's state at time, as a Frame.
+    def frame(self, time):
+        return Frame(time, self)
+
+
+    # Copy the character dicts into the crowd arrays. Raises ValueError if a character's target
+    # is a character outside the crowd.
+    def load(self, characters):
+        index = {id(character): i for i, character in enumerate(characters)}
+
+        for i, character in enumerate(characters):
+            for field in integer_fields + scalar_fields + vector_fields:
+                getattr(self, field)[i] = character[field]
+
+            target = character['target']
+            if isinstance(target, dict) and id(target) not in index:
+                raise ValueError(f"steering target {target['id']} is not a member of the crowd; mover_id={character['id']}")
+            self.target[i] = index.get(id(target), -1)
+            self.col_collided[i] = character['col_collided']
+
+
+    # Copy only the named fields of the character dicts into the crowd arrays.
+    def load_fields(self, characters, fields):
+        for field in fields:
+            getattr(self, field)[:] = [character[field] for character in characters]
+
+
+    # Copy the crowd arrays back into the character dicts.
+    def store(self, characters):
+        for i, character in enumerate(characters):
+            for field in integer_fields:
+                character[field] = int(getattr(self, field)[i])
+            for field in scalar_fields:
+                character[field] = float(getattr(self, field)[i])
+            for field in vector_fields:
+                character[field] = getattr(self, field)[i].copy()
+
+            character['col_collided'] = bool(self.col_collided[i])
+
+
+    # Vectorized dynamic_update; linear is N x 2 and angular is length N, one row per character.
+    # delta_time is a scalar, or one value per character when ensemble members use different steps.
+    # Intermediate results go into the crowd's scratch arrays, so a step allocates no new arrays.
+    def update(self, linear, angular, delta_time, physics, stop_velocity=0.02, warnings=False, scenario=None):
+        scratch, scratch_linear = self.scratch_vectors
+        sizes, scratch_angular = self.scratch_scalars
+        exceeded = self.scratch_mask
+        vector_time = delta_time[:, None] if np.ndim(delta_time) else delta_time
+
+        if physics:  # High School physics
+            half_t_sq = 0.5 * delta_time * delta_time
+            vector_half_t_sq = half_t_sq[:, None] if np.ndim(half_t_sq) else half_t_sq
+            np.multiply(self.velocity, vector_time, out=scratch)
+            np.multiply(linear, vector_half_t_sq, out=scratch_linear)
+            scratch += scratch_linear
+            self.position += scratch
+            np.multiply(self.rotation, delta_time, out=sizes)
+            np.multiply(angular, half_t_sq, out=scratch_angular)
+            sizes += scratch_angular
+            self.orientation += sizes
+        else:  # Newton-Euler-1 integration
+            np.multiply(self.velocity, vector_time, out=scratch)
+            self.position += scratch
+            np.multiply(self.rotation, delta_time, out=sizes)
+            self.orientation += sizes
+
+        np.remainder(self.orientation, 2 * np.pi, out=self.orientation)
+
+        np.multiply(linear, vector_time, out=scratch)
+        self.velocity += scratch
+        np.multiply(angular, delta_time, out=sizes)
+        self.rotation += sizes
+
+        np.copyto(self.linear, linear)
+        np.copyto(self.angular, angular)
+
+        # Stop moving at very low velocities; avoids jitter
+        self.row_magnitudes(self.velocity, sizes)
+        np.less(sizes, stop_velocity, out=exceeded)
+        np.copyto(self.velocity, 0, where=exceeded[:, None])
+        np.copyto(sizes, 0, where=exceeded)
+
+        np.greater(sizes, self.max_velocity, out=exceeded)
+        self.clamp(self.velocity, sizes, self.max_velocity, exceeded, "velocity", warnings, scenario)
+
+        self.row_magnitudes(self.linear, sizes)
+        np.greater(sizes, self.max_linear, out=exceeded)
+        self.clamp(self.linear, sizes, self.max_linear, exceeded, "linear", warnings, scenario)
+
+        np.abs(self.rotation, out=sizes)
+        np.greater(sizes, self.max_rotation, out=exceeded)
+        self.clamp(self.rotation, sizes, self.max_rotation, exceeded, "rotation", warnings, scenario)
+
+        np.abs(self.angular, out=sizes)
+        np.greater(sizes, self.max_angular, out=exceeded)
+        self.clamp(self.angular, sizes, self.max_angular, exceeded, "angular", warnings, scenario)
+
+
+    # Magnitude of each row of vectors, written into out; matches src.magnitudes bit for bit.
+    def row_magnitudes(self, vectors, out):
+        np.matmul(vectors[:, None, :], vectors[:, :, None], out=out[:, None, None])
+        return np.sqrt(out, out=out)
+
+
+    # Scale the exceeded rows of values down to their limits, in place, as limit * (value / size).
+    def clamp(self, values, sizes, limits, exceeded, name, warnings, scenario):
+        if warnings and exceeded.any():
+            self.warn(name, exceeded, values, warnings, scenario)
+
+        if values.ndim == 2:
+            exceeded, sizes, limits = exceeded[:, None], sizes[:, None], limits[:, None]
+        np.divide(values, sizes, out=values, where=exceeded)
+        np.multiply(limits, values, out=values, where=exceeded)
+
+
+    # Check whether any characters have collided; if so, immediately stop both at their midpoint.
+    # A spatial hash sized from the largest col_radius finds the colliding pairs, which are
+    # resolved in the same i < j order as an all-pairs check. Moving a pair to its midpoint can
+    # bring it into contact with others, so those later pairs are queued as they appear.
+    def check_collisions(self):
+        if self.count < 2:
+            return
+
+        cell_size = 2 * self.col_radius.max() or 1.0
+        i, j = neighborPairs(self.position, cell_size, self.ensemble)
+        colliding = magnitudes(self.position[i] - self.position[j]) <= self.col_radius[i] + self.col_radius[j]
+        pending = sorted(zip(i[colliding].tolist(), j[colliding].tolist()))
+        checked = None
+
+        while pending:
+            pair = heapq.heappop(pending)
+            if pair == checked:
+                continue
+            i, j = checked = pair
+
+            if not self.col_collided[i] or not self.col_collided[j]:
+                col_distance = magnitude(self.position[i] - self.position[j])
+                if col_distance <= self.col_radius[i] + self.col_radius[j]:
+                    col_position = (self.position[i] + self.position[j]) / 2
+                    for k in [i, j]:
+                        self.position[k] = col_position
+                        self.velocity[k] = 0
+                        self.linear[k] = 0
+                        self.rotation[k] = 0
+                        self.angular[k] = 0
+                        self.steer[k] = STOP
+                        self.col_collided[k] = True
+
+                    # Queue pairs after this one that the move brought into contact.
+                    col_distances = magnitudes(self.position - col_position)
+                    same_member = self.ensemble == self.ensemble[i]
+                    for k in [i, j]:
+                        for m in np.flatnonzero(same_member & (col_distances <= self.col_radius + self.col_radius[k])).tolist():
+                            later = (min(k, m), max(k, m))
+                            if m != k and later > pair:
+                                heapq.heappush(pending, later)
+
+
+    # Print one warning per character that exceeded a movement limit, as dynamic_update does.
+    def warn(self, name, exceeded, values, warnings, scenario):
+        if not warnings:
+            return
+
+        limits = getattr(self, "max_" + name)
+        for i in np.flatnonzero(exceeded):
+            print(f"character exceeded max {name} scenario={scenario} mover_id={self.id[i]} max_{name}={limits[i]} {name}={values[i]}")
+
+
+# One timestep of a simulation: its time and read-only views of the crowd's id, position,
+# velocity, linear, orientation, steer and col_collided arrays. The views share memory with the
+# crowd, so they show the next timestep once the simulation steps again; copy an array to keep it.
+class Frame:
+    fields = ["id", "position", "velocity", "linear", "orientation", "steer", "col_collided"]
+
+    def __init__(self, time, crowd):
+        self.time = time
+        for field in self.fields:
+            view = getattr(crowd, field).view()
+            view.flags.writeable = False
+            setattr(self, field, view)
+
+
+## Support Tests ##
+
+# Checks that the crowd engine gives the same results as the per-character code it replaces;
+# returns one result per check, as src.support_test does.
+def support_test():
+    from Init import character0, copyCharacter, stop_velocity
+    from move import dynamic_update
+    results = []
+    rng = np.random.default_rng(330)
+
+    # Crowd.update matches dynamic_update bit for bit over several steps, for both integrations,
+    # with speeds and steering that cross every limit and the stop velocity
+    for physics in [True, False]:
+        characters = []
+        for k in range(200):
+            character = copyCharacter(character0)
+            character.update(id=k, position=rng.uniform(-50, 50, 2), velocity=rng.normal(size=2) * rng.choice([0.001, 1, 5]),
+                             orientation=rng.uniform(0, 7), rotation=rng.normal(), max_velocity=rng.uniform(0.5, 3),
+                             max_linear=rng.uniform(0.5, 3), max_rotation=rng.uniform(0.5, 3), max_angular=rng.uniform(0.5, 3))
+            characters.append(character)
+        crowd = Crowd.from_characters(characters)
+
+        for step in range(5):
+            linear = rng.normal(size=(len(characters), 2)) * 3
+            angular = rng.normal(size=len(characters)) * 3
+            crowd.update(linear, angular, 0.5, physics, stop_velocity)
+            for k, character in enumerate(characters):
+                dynamic_update(character, {"linear": linear[k].copy(), "angular": float(angular[k])}, 0.5, physics)
+
+        expected = Crowd.from_characters(characters)
+        results.append(all(np.array_equal(getattr(crowd, field), getattr(expected, field)) for field in ["position", "velocity", "linear", "orientation", "rotation", "angular"]))
+
+    # Separate and Avoid Collisions steering, with the spatial hash and the all-pairs closest
+    # approach, match the per-character code for a crowd where most characters have neighbors
+    from Init import SEPARATE, AVOID_COLLISIONS
+    from move import get_steering, prepare_mover
+    from steering import crowd_get_steering
+    for steer in [SEPARATE, AVOID_COLLISIONS]:
+        characters = []
+        for k in range(150):
+            character = copyCharacter(character0)
+            character.update(id=k, steer=steer, position=rng.uniform(-30, 30, 2), velocity=rng.normal(size=2) * 3,
+                             max_linear=rng.uniform(0.5, 3), sep_threshold=rng.uniform(2, 10), sep_decay=50,
+                             avoid_radius=rng.uniform(1, 5), col_lookahead=rng.uniform(1, 10))
+            characters.append(prepare_mover(character))
+        crowd = Crowd.from_characters(characters)
+        linear, angular = crowd_get_steering(crowd, np.zeros((len(characters), 2)), np.zeros(len(characters)))
+        expected = np.array([get_steering(character, [], characters)['linear'] for character in characters])
+        results.append(np.count_nonzero(expected.any(axis=1)) > len(characters) // 4 and np.array_equal(linear, expected)
+                       and not angular.any())
+
+    # check_collisions, with its spatial hash, matches checking every pair in order
+    count = 300
+    crowd = Crowd(count)
+    crowd.position[:] = rng.uniform(-20, 20, (count, 2))
+    crowd.velocity[:] = rng.normal(size=(count, 2))
+    crowd.col_radius[:] = rng.uniform(0.2, 1.5, count)
+    crowd.col_collided[:] = rng.random(count) < 0.1
+    position, velocity, steer, collided = crowd.position.copy(), crowd.velocity.copy(), crowd.steer.copy(), crowd.col_collided.copy()
+    for i in range(count - 1):
+        for j in range(i + 1, count):
+            if not collided[i] or not collided[j]:
+                if magnitude(position[i] - position[j]) <= crowd.col_radius[i] + crowd.col_radius[j]:
+                    col_position = (position[i] + position[j]) / 2
+                    for k in [i, j]:
+                        position[k], velocity[k], steer[k], collided[k] = col_position, 0, STOP, True
+
+    crowd.check_collisions()
+    results.append(np.array_equal(crowd.position, position) and np.array_equal(crowd.velocity, velocity)
+                   and np.array_equal(crowd.steer, steer) and np.array_equal(crowd.col_collided, collided))
+
+    # Members of a tiled ensemble never collide with each other's characters
+    ensemble = Crowd.from_characters(characters).tile(3)
+    ensemble.col_radius[:] = 1.0
+    single = Crowd(len(characters))
+    single.position[:], single.col_radius[:] = ensemble.position[:len(characters)], 1.0
+    ensemble.check_collisions()
+    single.check_collisions()
+    results.append(all(np.array_equal(member, single.position) for member in ensemble.position.reshape(3, len(characters), 2)))
+
+    # Targets outside the crowd and behaviors with no crowd kernel raise ValueError, as in move.get_steering
+    from Init import SEEK, ALIGN
+    from steering import crowd_get_steering
+    outsider = copyCharacter(character0)
+    seeker = copyCharacter(character0)
+    seeker.update(steer=SEEK, target=outsider)
+    aligner = copyCharacter(character0)
+    aligner['steer'] = ALIGN
+    for build in [lambda: Crowd.from_characters([seeker]),
+                  lambda: crowd_get_steering(Crowd.from_characters([aligner]), np.zeros((1, 2)), np.zeros(1))]:
+        try:
+            build()
+            results.append(False)
+        except ValueError:
+            results.append(True)
+
+    # Wander gives the same trajectory in a fresh process, with a different hash seed, as in this one
+    import os
+    import subprocess
+    import sys
+    from Init import init_scenario
+    from move import simulate_frames
+    run = "from Init import init_scenario; from move import simulate_frames; *_, last = simulate_frames(init_scenario(24)); print(last.position.tobytes().hex())"
+    here = os.path.dirname(os.path.abspath(__file__))
+    other = subprocess.run([sys.executable, "-c", run], cwd=here, capture_output=True, text=True,
+                           env=dict(os.environ, PYTHONHASHSEED="12345"))
+    *_, last = simulate_frames(init_scenario(24))
+    results.append(other.returncode == 0 and other.stdout.strip() == last.position.tobytes().hex())
+
+    # Frames from both engines are read-only, so a consumer can't change the crowd through them
+    for crowd_engine in [True, False]:
+        frames = simulate_frames(init_scenario(26), crowd_engine)
+        next(frames)
+        frame = next(frames)
+        read_only = []
+        for field in Frame.fields:
+            try:
+                getattr(frame, field)[0] = getattr(frame, field)[0]
+                read_only.append(False)
+            except ValueError:
+                read_only.append(True)
+        results.append(all(read_only))
+
+    return results
+
+
+if __name__ == "__main__":
+    # support_test runs only when this script is run directly, and not when imported as a module
+    results = support_test()
+    for idx, result in enumerate(results):
+        print(f"Test {idx+1} {'PASSED' if result else 'FAILED'}")
@@ -1,8 +1,13 @@
 # Author: Isaiah Harville
 # Purpose: Main file that will produce the trajectory text file.
 
+import math
 import numpy as np
 from Init import *
+from crowd import Crowd, Frame
+from steering import crowd_get_steering, behavior_name
+from trajectory import open_trajectory_writer
+from profiling import StepProfiler, disabled_profiler
 
 # Define dynamic movement functions, aka steering behaviors.
 
@@ -13,22 +18,27 @@ def dynamic_get_steering_continue(mover):
 # Stop; bring character to a stop, with slowing limited by character's maximum acceleration.
 def dynamic_get_steering_stop(mover):
     result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
-    result["linear"] = -mover["velocity"]
+    linear = -Vec2.of(mover["velocity"])
     
-    if magnitude(result["linear"]) > mover["max_linear"]:
-        result["linear"] = normalize(result["linear"]) * mover["max_linear"]
+    if linear.magnitude() > mover["max_linear"]:
+        linear = linear.normalize() * mover["max_linear"]
     
+    result["linear"] = linear.array()
     result["angular"] = -mover["rotation"]
     return result
 
 # Align; match orientation to orientation of target.
 def dynamic_get_steering_align(mover, target):
+    return dynamic_align_orientation(mover, target["orientation"])
+
+# Turn toward an orientation; no steering within align_radius of it.
+def dynamic_align_orientation(mover, orientation):
     result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
-    rotation = target["orientation"] - mover["orientation"]
+    rotation = orientation - mover["orientation"]
     rotation = convertAngle(rotation)
     
     if abs(rotation) < mover["align_radius"]:
-        result["angular"] = -result["angular"]
+        return result
     
     if abs(rotation) > mover["align_slow"]:
         align_rotation = mover["max_rotation"]
@@ -43,27 +53,54 @@ def dynamic_get_steering_align(mover, target):
     
     return result
 
+# Face; turn toward target's position.
+def dynamic_get_steering_face(mover, target):
+    direction = target['position'] - mover['position']
+    
+    if magnitude(direction) == 0:
+        return {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
+    
+    return dynamic_align_orientation(mover, math.atan2(direction[1], direction[0]))
+
+# Wander; face a target that drifts randomly around a circle ahead of the character, while
+# accelerating at maximum along the current orientation. The drift comes from the character's
+# random stream, mover['random'].
+def dynamic_get_steering_wander(mover):
+    mover['wander_orientation'] += randomBinomial(mover['random']) * mover['wander_rate']
+    target_orientation = mover['wander_orientation'] + mover['orientation']
+    heading = orientationToVector(mover['orientation'])
+    
+    center = mover['position'] + mover['wander_offset'] * heading
+    target = {'position': center + mover['wander_radius'] * orientationToVector(target_orientation)}
+    result = dynamic_get_steering_face(mover, target)
+    result['linear'] = mover['max_linear'] * heading
+    
+    return result
+
+# The position steering behaviors below do their vector math with Vec2 floats rather than
+# length-2 NumPy arrays, and return NumPy arrays for dynamic_update.
+
 # Seek; move toward target.
 def dynamic_get_steering_seek(mover, target):
     result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
-    direction = target['position'] - mover['position']
-    result['linear'] = normalize(direction) * mover['max_linear']
+    direction = Vec2.of(target['position']) - Vec2.of(mover['position'])
+    result['linear'] = (direction.normalize() * mover['max_linear']).array()
     
     return result
 
 # Flee; move away from target.
 def dynamic_get_steering_flee(mover, target):
     result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
-    direction = mover['position'] - target['position']
-    result['linear'] = normalize(direction) * mover['max_linear']
+    direction = Vec2.of(mover['position']) - Vec2.of(target['position'])
+    result['linear'] = (direction.normalize() * mover['max_linear']).array()
    
     return result
 
 # Arrive; move toward target, slowing as distance decreases.
 def dynamic_get_steering_arrive(mover, target):
     result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
-    direction = target['position'] - mover['position']
-    distance = magnitude(direction)
+    direction = Vec2.of(target['position']) - Vec2.of(mover['position'])
+    distance = direction.magnitude()
     
     if distance < mover['arrive_radius']:
         arrive_speed = 0
@@ -72,58 +109,125 @@ def dynamic_get_steering_arrive(mover, target):
     else:
         arrive_speed = mover['max_velocity'] * distance / mover['arrive_slow']
     
-    arrive_velocity = normalize(direction) * arrive_speed
-    result['linear'] = ((arrive_velocity - mover['velocity']) / mover['arrive_time'])
+    arrive_velocity = direction.normalize() * arrive_speed
+    linear = (arrive_velocity - Vec2.of(mover['velocity'])) / mover['arrive_time']
 
-    if magnitude(result['linear']) > mover['max_linear']:
-        result['linear'] = normalize(result['linear']) * mover['max_linear']
+    if linear.magnitude() > mover['max_linear']:
+        linear = linear.normalize() * mover['max_linear']
     
+    result['linear'] = linear.array()
     return result
 
+# Follow path; seek a point path_offset ahead of the closest point on the path, tracking the
+# character's closest segment from step to step.
 def dynamic_get_steering_follow_path(mover, path):
-    current_param = getPathParam(path, mover['position'])
+    current_param, mover['path_segment'] = trackPathParamVec2(path, mover['position'], mover['path_segment'], mover['path_window'])
     target_param = min(1, current_param + mover['path_offset'])
     target_position = getPathPosition(path, target_param)
     target = {'position': target_position}
     return dynamic_get_steering_seek(mover, target)
 
 
+# Separate; accelerate away from every other character within sep_threshold, with strength
+# sep_decay / distance^2 per neighbor, up to max_linear, and the total limited to max_linear.
+def dynamic_get_steering_separate(mover, Character):
+    result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
+    
+    for other in Character:
+        direction = mover['position'] - other['position']
+        distance = magnitude(direction)
+        
+        if 0 < distance < mover['sep_threshold']:
+            strength = min(mover['sep_decay'] / (distance * distance), mover['max_linear'])
+            result['linear'] += strength * normalize(direction)
+    
+    if magnitude(result['linear']) > mover['max_linear']:
+        result['linear'] = normalize(result['linear']) * mover['max_linear']
+    
+    return result
+
+# Avoid collisions; find the character's earliest predicted collision within col_lookahead time,
+# the closest approach that comes within avoid_radius, and accelerate away from the other character's
+# position at that time. A character with no predicted collision gets no steering.
+def dynamic_get_steering_avoid_collisions(mover, Character):
+    result = {"linear": np.array([0.0, 0.0], dtype=np.float64), "angular": 0.0}
+    first_t = math.inf
+    
+    for other in Character:
+        if other is mover:
+            continue
+        
+        closest_t, closest_d, closest_A, closest_B = closest_approach(mover['position'], mover['velocity'], other['position'], other['velocity'])
+        if 0 < closest_t <= mover['col_lookahead'] and closest_d <= mover['avoid_radius'] and closest_t < first_t:
+            first_t = closest_t
+            away = closest_A - closest_B
+            
+            # Head-on closest approaches meet at one point; steer away from the other character's current position.
+            if magnitude(away) == 0:
+                away = mover['position'] - other['position']
+    
+    if first_t < math.inf:
+        result['linear'] = normalize(away) * mover['max_linear']
+    
+    return result
+
 
 ## Dynamic Update ##
+
+# Make a character's position, velocity and linear float64 arrays, which dynamic_update writes into
+# in place; characters from init_scenario already have their own.
+def prepare_mover(mover):
+    for field in ['position', 'velocity', 'linear']:
+        mover[field] = np.asarray(mover[field], dtype=np.float64)
+    return mover
+
+# Update a mover in place; each vector's magnitude is computed once. Intermediate vectors go into
+# scratch arrays kept on the mover, so steady-state updates allocate nothing.
 def dynamic_update(mover, steering, delta_time, physics, warnings=False, scenario=None):
-    mover['position'] = np.array(mover['position']).astype(np.float64)
-    mover['velocity'] =  np.array(mover['velocity']).astype(np.float64)
-    steering['linear'] = np.array(steering['linear']).astype(np.float64)
+    position, velocity, linear = mover['position'], mover['velocity'], mover['linear']
+    if 'update_scratch' not in mover:
+        mover['update_scratch'] = np.zeros((2, 2), dtype=np.float64)
+    scratch, scratch_linear = mover['update_scratch']
 
     if physics:  # High School physics
         half_t_sq = 0.5 * delta_time * delta_time
-        mover['position'] += mover['velocity'] * delta_time + steering['linear'] * half_t_sq
+        np.multiply(velocity, delta_time, out=scratch)
+        np.multiply(steering['linear'], half_t_sq, out=scratch_linear)
+        scratch += scratch_linear
+        position += scratch
         mover['orientation'] += mover['rotation'] * delta_time + steering['angular'] * half_t_sq
     else:  # Newton-Euler-1 integration
-        mover['position'] += mover['velocity'] * delta_time
+        np.multiply(velocity, delta_time, out=scratch)
+        position += scratch
         mover['orientation'] += mover['rotation'] * delta_time
 
     mover['orientation'] = mover['orientation'] % (2 * np.pi)
 
-    mover['velocity'] += steering['linear'] * delta_time
+    np.multiply(steering['linear'], delta_time, out=scratch)
+    velocity += scratch
     mover['rotation'] += steering['angular'] * delta_time
 
-    mover['linear'] = steering['linear']
+    np.copyto(linear, steering['linear'])
     mover['angular'] = steering['angular']
 
     # Stop moving at very low velocities; avoids jitter
-    if magnitude(mover['velocity']) < stop_velocity:
-        mover['velocity'] = np.array([0, 0])
+    speed = math.sqrt(velocity.dot(velocity))
+    if speed < stop_velocity:
+        velocity.fill(0)
+        speed = 0
 
-    if magnitude(mover['velocity']) > mover['max_velocity']:
+    if speed > mover['max_velocity']:
         if warnings:
-            print(f"character exceeded max velocity scenario={scenario} mover_id={mover['id']} max_velocity={mover['max_velocity']} velocity={mover['velocity']}")
-        mover['velocity'] = mover['max_velocity'] * (mover['velocity'] / magnitude(mover['velocity']))
+            print(f"character exceeded max velocity scenario={scenario} mover_id={mover['id']} max_velocity={mover['max_velocity']} velocity={velocity}")
+        velocity /= speed
+        velocity *= mover['max_velocity']
 
-    if magnitude(mover['linear']) > mover['max_linear']:
+    linear_magnitude = math.sqrt(linear.dot(linear))
+    if linear_magnitude > mover['max_linear']:
         if warnings:
-            print(f"character exceeded max linear scenario={scenario} mover_id={mover['id']} max_linear={mover['max_linear']} linear={mover['linear']}")
-        mover['linear'] = mover['max_linear'] * (mover['linear'] / magnitude(mover['linear']))
+            print(f"character exceeded max linear scenario={scenario} mover_id={mover['id']} max_linear={mover['max_linear']} linear={linear}")
+        linear /= linear_magnitude
+        linear *= mover['max_linear']
 
     if abs(mover['rotation']) > mover['max_rotation']:
         if warnings:
@@ -137,65 +241,138 @@ def dynamic_update(mover, steering, delta_time, physics, warnings=False, scenari
 
     return mover
 
-def write_trajectory(character, time, trajectory_file):
-    # Verifying the data
-    if np.isnan(character['position']).any():
-        print("NaN detected in position:", character['position'])
-    if np.isnan(character['velocity']).any():
-        print("NaN detected in velocity:", character['velocity'])
-    if np.isnan(character['linear']).any():
-        print("NaN detected in linear:", character['linear'])
-  
-    char_out = f"{time},{character['id']},{character['position'][0]},{character['position'][1]},{character['velocity'][0]},{character['velocity'][1]},{character['linear'][0]},{character['linear'][1]},{character['orientation']},{character['steer']},{character['col_collided']}"
-    with open(trajectory_file, 'a') as file:
-        file.write(char_out + "\n")
-
-
-## Write initial positions and movement variables for all characters to trajectory file. ##
-for char in Character:
-    write_trajectory(char, Time, trajectory_file)
-
-# Calculate trajectory, timestep by timestep.
-while Time < stop_time:
-    Time += delta_time
- 
-    for i in range(len(Character)):
-        # Select and call a steering behavior.
-        if Character[i]['steer'] == CONTINUE:
-            steering = dynamic_get_steering_continue(Character[i])
-        elif Character[i]['steer'] == STOP:
-            steering = dynamic_get_steering_stop(Character[i])
-        elif Character[i]['steer'] == SEEK:
-            steering = dynamic_get_steering_seek(Character[i], Character[i]['target'])
-        elif Character[i]['steer'] == FLEE:
-            steering = dynamic_get_steering_flee(Character[i], Character[i]['target'])
-        elif Character[i]['steer'] == ARRIVE:
-            steering = dynamic_get_steering_arrive(Character[i], Character[i]['target'])
-        elif Character[i]['steer'] == FOLLOW_PATH:
-            pathToFollow = Character[i]['path_to_follow']
-            steering = dynamic_get_steering_follow_path(Character[i], Path[pathToFollow-1])
-
-        # Update the character's movement variables.
-        Character[i] = dynamic_update(Character[i], steering, delta_time, physics, warnings=False, scenario=29)
-
-    # Check whether any characters have collided; if so, immediately stop both.
-    if check_collisions:
-        for i in range(len(Character) - 1):
-            for j in range(i + 1, len(Character)):
-                if not Character[i]['col_collided'] or not Character[j]['col_collided']:
-                    col_distance = magnitude(Character[i]['position'] - Character[j]['position'])
-                    col_radii = Character[i]['col_radius'] + Character[j]['col_radius']
-                    if col_distance <= col_radii:
-                        col_position = (Character[i]['position'] + Character[j]['position']) / 2
-                        for k in [i, j]:
-                            Character[k]['position'] = col_position
-                            Character[k]['velocity'] = np.array([0, 0])
-                            Character[k]['linear'] = np.array([0, 0])
-                            Character[k]['rotation'] = 0
-                            Character[k]['angular'] = 0
-                            Character[k]['steer'] = STOP
-                            Character[k]['col_collided'] = True
-
-    # Write updated positions and movement variables for each character to trajectory file.
-    for char in Character:
-        write_trajectory(char, Time, trajectory_file)
+# Select a steering behavior for a character and call it; Character is every character, for
+# behaviors that react to the others.
+def get_steering(mover, Path, Character=()):
+    if mover['steer'] == CONTINUE:
+        return dynamic_get_steering_continue(mover)
+    elif mover['steer'] == STOP:
+        return dynamic_get_steering_stop(mover)
+    elif mover['steer'] == SEEK:
+        return dynamic_get_steering_seek(mover, mover['target'])
+    elif mover['steer'] == FLEE:
+        return dynamic_get_steering_flee(mover, mover['target'])
+    elif mover['steer'] == ARRIVE:
+        return dynamic_get_steering_arrive(mover, mover['target'])
+    elif mover['steer'] == WANDER:
+        return dynamic_get_steering_wander(mover)
+    elif mover['steer'] == FOLLOW_PATH:
+        pathToFollow = mover['path_to_follow']
+        return dynamic_get_steering_follow_path(mover, Path[pathToFollow-1])
+    elif mover['steer'] == SEPARATE:
+        return dynamic_get_steering_separate(mover, Character)
+    elif mover['steer'] == AVOID_COLLISIONS:
+        return dynamic_get_steering_avoid_collisions(mover, Character)
+    else:
+        raise ValueError(f"steering behavior {mover['steer']} is not supported by the per-character engine; mover_id={mover['id']}")
+
+# Check whether any characters have collided; if so, immediately stop both.
+def check_character_collisions(Character):
+    crowd = Crowd.from_characters(Character)
+    crowd.check_collisions()
+    crowd.store(Character)
+
+
+# Simulate a scenario's settings, as returned by init_scenario, yielding a read-only Frame of
+# every character's state at time 0 and after each timestep. Frames are views of the running
+# simulation, valid until the next frame is requested. Once the last frame is consumed, the
+# characters' final state is stored back into settings['Character'].
+# A StepProfiler, if given, times each step and its steering, update and collision phases; the
+# consumer's handling of a frame counts toward that step's time.
+def simulate_frames(settings, crowd_engine=crowd_engine, profiler=disabled_profiler):
+    Character, Path = settings['Character'], settings['Path']
+    physics, delta_time, stop_time = settings['physics'], settings['delta_time'], settings['stop_time']
+    check_collisions, scenario = settings['check_collisions'], settings['scenario']
+    Time = 0
+    steering_sections = {code: "steering " + behavior_name(code) for code in range(CONTINUE, SWIRL + 1)}
+
+    ## Initial positions and movement variables for all characters. ##
+    if crowd_engine:
+        crowd = Crowd.from_characters(Character, Path, settings['seed'])
+        linear = np.zeros((crowd.count, 2), dtype=np.float64)
+        angular = np.zeros(crowd.count, dtype=np.float64)
+        yield crowd.frame(Time)
+    else:
+        for char in Character:
+            prepare_mover(char)
+            char['random'] = characterGenerator(settings['seed'], char['id'])
+        # Frames come from a crowd built once, refreshed with just the frame fields each step.
+        frame_crowd = Crowd.from_characters(Character)
+        yield frame_crowd.frame(Time)
+
+    # Calculate trajectory, timestep by timestep.
+    while Time < stop_time:
+        Time += delta_time
+        profiler.begin_step()
+
+        if crowd_engine:
+            # Steer each behavior group in one call, then update the whole crowd at once.
+            crowd_get_steering(crowd, linear, angular, profiler)
+            with profiler.section("update", crowd.count):
+                crowd.update(linear, angular, delta_time, physics, stop_velocity, warnings=False, scenario=scenario)
+
+            if check_collisions:
+                with profiler.section("collisions", crowd.count):
+                    crowd.check_collisions()
+
+            # Updated positions and movement variables for each character.
+            yield crowd.frame(Time)
+        else:
+            # Profiling sections are only entered when the profiler is on, so a normal run's loop
+            # does no extra work per character.
+            if profiler.enabled:
+                for i in range(len(Character)):
+                    steer = Character[i]['steer']
+                    with profiler.section(steering_sections.get(steer) or "steering " + behavior_name(steer)):
+                        steering = get_steering(Character[i], Path, Character)
+                    with profiler.section("update"):
+                        Character[i] = dynamic_update(Character[i], steering, delta_time, physics, warnings=False, scenario=scenario)
+            else:
+                for i in range(len(Character)):
+                    # Update the character's movement variables.
+                    steering = get_steering(Character[i], Path, Character)
+                    Character[i] = dynamic_update(Character[i], steering, delta_time, physics, warnings=False, scenario=scenario)
+
+            if check_collisions:
+                with profiler.section("collisions", len(Character)):
+                    check_character_collisions(Character)
+
+            frame_crowd.load_fields(Character, Frame.fields)
+            yield frame_crowd.frame(Time)
+
+        profiler.end_step()
+
+    if crowd_engine:
+        crowd.store(Character)
+
+
+# Simulate a scenario's settings, as returned by init_scenario, writing the trajectory file.
+# A StepProfiler, if given, times each step and its steering, update, collision and I/O phases.
+# index writes a sidecar index alongside a text trajectory file, thread writes the file on a
+# background thread, and tolerance and chunk_steps set a compressed (.trz) file's precision and
+# block size.
+def run_simulation(settings, trajectory_file, crowd_engine=crowd_engine, profiler=disabled_profiler, index=trajectory_index, thread=trajectory_thread,
+                   tolerance=trajectory_tolerance, chunk_steps=trajectory_chunk_steps):
+    frames = simulate_frames(settings, crowd_engine, profiler)
+
+    # The writer is closed even if the simulation fails, so every step already written is kept.
+    with open_trajectory_writer(trajectory_file, index=index, thread=thread, tolerance=tolerance, chunk_steps=chunk_steps) as writer:
+        ## Write initial positions and movement variables for all characters to trajectory file. ##
+        frame = next(frames)
+        writer.write_step(frame.time, frame)
+
+        # Write updated positions and movement variables for each character to trajectory file.
+        for frame in frames:
+            with profiler.section("io", len(frame.id)):
+                writer.write_step(frame.time, frame)
+
+    return settings['Character']
+
+
+if __name__ == "__main__":
+    profiler = StepProfiler() if profile_file else disabled_profiler
+    run_simulation(settings, trajectory_file, profiler=profiler)
+
+    if profile_file:
+        profiler.print_summary()
+        profiler.write(profile_file)
@@ -1,11 +1,13 @@
-import math
+import numpy as np
 from matplotlib import pyplot as plt
-from Init import plot_what
+from matplotlib.collections import LineCollection
+from Init import plot_what, trajectory_file
+from trajectory import load_binary_trajectory, load_compressed_trajectory, load_text_trajectory, character_tracks
 
 # Created by Joshua Payne
 # Updated by Isaiah Harville on 9/9/2023
 
-inFileName = 'Trajectory_Data.txt' #Change to any file name, if left empty the user will be prompted for the file name upon execution
+inFileName = trajectory_file #Change to any file name (defaults to Init.trajectory_file), if left empty the user will be prompted for the file name upon execution
 
 class Character:
     def __init__(self, steerType):
@@ -29,32 +31,29 @@ class Character:
         circle = plt.Circle(startPos, 2, color = 'red', fill = True) 
         plt.gcf().gca().add_artist(circle)
 
-        steeringBehaviorCode = {1 : 'Continue', 2 : 'Stop',  3 : 'Align', 6 : 'Seek', 7 : 'Flee', 8 : 'Arrive', 11 : 'Follow Path'}
+        steeringBehaviorCode = {1 : 'Continue', 2 : 'Stop',  3 : 'Align', 6 : 'Seek', 7 : 'Flee', 8 : 'Arrive', 10 : 'Wander', 11 : 'Follow Path', 12 : 'Separate', 13 : 'Avoid Collisions'}
         plt.text(startPos[0] + 3, startPos[1] + 1, steeringBehaviorCode[self.steerType], fontsize = 10, color = 'red')
 
 
     def plotVelocity(self):
-        for i in range(self.rows):
-            x = [self.posX[i], self.posX[i] + self.velX[i] * 2]
-            z = [self.posZ[i], self.posZ[i] + self.velZ[i] * 2]
-
-            plt.plot(x, z, color = 'lime', linewidth = 1)
+        posX, posZ = np.asarray(self.posX), np.asarray(self.posZ)
+        plotSegments(posX, posZ, posX + np.asarray(self.velX) * 2, posZ + np.asarray(self.velZ) * 2, 'lime')
 
 
     def plotLinear(self):
-        for i in range(self.rows):
-            x = [self.posX[i], self.posX[i] + self.linX[i]]
-            z = [self.posZ[i], self.posZ[i] + self.linZ[i]]
-
-            plt.plot(x, z, color = 'blue', linewidth = 1)
+        posX, posZ = np.asarray(self.posX), np.asarray(self.posZ)
+        plotSegments(posX, posZ, posX + np.asarray(self.linX), posZ + np.asarray(self.linZ), 'blue')
 
 
     def plotOrientation(self):
-        for i in range(self.rows):
-            x = [self.posX[i], self.posX[i] + self.orientationX[i]]
-            z = [self.posZ[i], self.posZ[i] + self.orientationZ[i]]
+        posX, posZ = np.asarray(self.posX), np.asarray(self.posZ)
+        plotSegments(posX, posZ, posX + np.asarray(self.orientationX), posZ + np.asarray(self.orientationZ), 'blue')
 
-            plt.plot(x, z, color = 'blue', linewidth = 1)
+# Draw one line per row, from (x0, z0) to (x1, z1), as a single LineCollection styled like plt.plot lines
+def plotSegments(x0, z0, x1, z1, color):
+    segments = np.stack([np.column_stack([x0, z0]), np.column_stack([x1, z1])], axis = 1)
+    lines = LineCollection(segments, colors = color, linewidths = 1, capstyle = 'projecting', joinstyle = 'round', zorder = 2)
+    plt.gca().add_collection(lines, autolim = False)
 
 # For Path Following
 class PathFollow:
@@ -104,32 +103,28 @@ plt.legend(loc = 'lower right')
 if inFileName == '':
     inFileName = input('Enter the name of the input file: ')
 
-inFile = open(inFileName, 'r')
-lines = inFile.readlines()
-
 characters = {} # Dictionary of all characters to be plotted
 
-for line in lines: # Reading through input file line by line
-    data = line.split(',') # Splitting line up into an array of values
-    data = [float(i) for i in data if i not in ["True", "False", "True\n", "False\n"]] # Converting all values to floats, except for boolean values
-
-    ID = data[1]
-    
-    # If character is not already in dict, add it
-    if ID not in characters:
-        steerType = data[9]
-        characters[ID] = Character(steerType)
-
-    # Adding all line data to specified character
-    characters[ID].rows += 1
-    characters[ID].posX.append(data[2])
-    characters[ID].posZ.append(data[3])
-    characters[ID].velX.append(data[4])
-    characters[ID].velZ.append(data[5])
-    characters[ID].linX.append(data[6])
-    characters[ID].linZ.append(data[7])
-    characters[ID].orientationX.append(math.cos(data[8]) + data[2])
-    characters[ID].orientationZ.append(math.sin(data[8]) + data[3])
+# Read the whole file into trajectory records, then give each character views of its own columns
+if inFileName.endswith('.npy'): # Binary trajectory; memory-mapped, one column per character
+    data = load_binary_trajectory(inFileName)
+    tracks = [data[:, k] for k in range(data.shape[1])]
+elif inFileName.endswith('.trz'): # Compressed trajectory
+    data = load_compressed_trajectory(inFileName)
+    tracks = [data[:, k] for k in range(data.shape[1])]
+else: # Text trajectory; parsed in one pass, then grouped by character id
+    tracks = character_tracks(load_text_trajectory(inFileName))
+
+for track in tracks:
+    ID = track['id'][0]
+    characters[ID] = Character(track['steer'][0])
+
+    characters[ID].rows = len(track)
+    characters[ID].posX, characters[ID].posZ = track['position'][:, 0], track['position'][:, 1]
+    characters[ID].velX, characters[ID].velZ = track['velocity'][:, 0], track['velocity'][:, 1]
+    characters[ID].linX, characters[ID].linZ = track['linear'][:, 0], track['linear'][:, 1]
+    characters[ID].orientationX = np.cos(track['orientation']) + track['position'][:, 0]
+    characters[ID].orientationZ = np.sin(track['orientation']) + track['position'][:, 1]
 
 # Looping through all characters and plotting their data
 for ID in characters:
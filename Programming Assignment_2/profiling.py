@@ -0,0 +1,164 @@
+# Author: Isaiah Harville
+# Purpose: Time the phases of a simulation step, per steering behavior, and report where the time goes.
+
+import contextlib
+import csv
+import json
+import time
+
+# Shared do-nothing section, returned by a disabled profiler.
+disabled_section = contextlib.nullcontext()
+
+
+# Times one section of a step and adds it to the profiler on exit.
+class ProfileSection:
+    __slots__ = ('profiler', 'name', 'items', 'start')
+
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start, self.items)
+        return False
+
+
+# Accumulates wall time, call counts and items (such as characters steered) per named section,
+# and the wall time of each whole step. A disabled profiler records nothing, and its section()
+# returns a shared null context, so leaving the calls in the step loop costs almost nothing.
+class StepProfiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.seconds = {}
+        self.calls = {}
+        self.items = {}
+        self.step_seconds = []
+        self.step_start = None
+
+    # Context manager timing one section; items counts what the section handled.
+    def section(self, name, items=1):
+        if not self.enabled:
+            return disabled_section
+        return ProfileSection(self, name, items)
+
+    def add(self, name, seconds, items=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.items[name] = self.items.get(name, 0) + items
+
+    def begin_step(self):
+        if self.enabled:
+            self.step_start = time.perf_counter()
+
+    def end_step(self):
+        if self.enabled:
+            self.step_seconds.append(time.perf_counter() - self.step_start)
+
+
+    # One row per section, slowest first, plus a row for whole steps; share is the fraction of
+    # total step time.
+    def summary(self):
+        total = sum(self.step_seconds)
+        rows = []
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            rows.append({
+                "section": name,
+                "calls": self.calls[name],
+                "items": self.items[name],
+                "seconds": self.seconds[name],
+                "ms_per_call": 1e3 * self.seconds[name] / self.calls[name],
+                "share": self.seconds[name] / total if total else 0.0
+            })
+
+        steps = len(self.step_seconds)
+        rows.append({
+            "section": "step",
+            "calls": steps,
+            "items": steps,
+            "seconds": total,
+            "ms_per_call": 1e3 * total / steps if steps else 0.0,
+            "share": 1.0 if total else 0.0
+        })
+        return rows
+
+    def print_summary(self):
+        print(f"{'section':<28}{'calls':>8}{'items':>10}{'seconds':>10}{'ms/call':>10}{'share':>8}")
+        for row in self.summary():
+            print(f"{row['section']:<28}{row['calls']:>8}{row['items']:>10}{row['seconds']:>10.4f}{row['ms_per_call']:>10.4f}{row['share']:>8.1%}")
+        if self.step_seconds:
+            print(f"slowest step {1e3 * max(self.step_seconds):.4f} ms")
+
+    # Write the summary to filename, as CSV for a .csv name and JSON otherwise; the JSON also
+    # holds every step's time.
+    def write(self, filename):
+        rows = self.summary()
+        if filename.endswith(".csv"):
+            with open(filename, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(filename, 'w') as file:
+                json.dump({"sections": rows, "step_seconds": self.step_seconds}, file, indent=2)
+
+
+# Profiler used when none is given.
+disabled_profiler = StepProfiler(enabled=False)
+
+
+## Support Tests ##
+
+# Checks the profiler's sections, counts and output files for a profiled run of each engine;
+# returns one result per check, as src.support_test does.
+def support_test():
+    import os
+    import tempfile
+    from Init import init_scenario
+    from move import run_simulation
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Scenario 26 steps 100 times with one Continue, Flee, Seek and Arrive character each; every
+        # section, writing the trajectory included, is timed within its step
+        for crowd_engine, update_calls in [(True, 100), (False, 400)]:
+            profiler = StepProfiler()
+            run_simulation(init_scenario(26), os.path.join(directory, "trajectory.txt"), crowd_engine, profiler, thread=False)
+            rows = {row["section"]: row for row in profiler.summary()}
+            expected = {"steering continue": (100, 100), "steering flee": (100, 100), "steering seek": (100, 100),
+                        "steering arrive": (100, 100), "update": (update_calls, 400), "io": (100, 400), "step": (100, 100)}
+            results.append(set(rows) == set(expected)
+                           and all((rows[name]["calls"], rows[name]["items"]) == counts for name, counts in expected.items())
+                           and sum(row["seconds"] for name, row in rows.items() if name != "step") <= rows["step"]["seconds"])
+
+        # The CSV file holds the summary, and the JSON file also every step's time
+        csv_file, json_file = os.path.join(directory, "profile.csv"), os.path.join(directory, "profile.json")
+        profiler.write(csv_file)
+        profiler.write(json_file)
+        with open(csv_file, newline='') as file:
+            written = list(csv.DictReader(file))
+        with open(json_file) as file:
+            report = json.load(file)
+        results.append([row["section"] for row in written] == [row["section"] for row in profiler.summary()]
+                       and report["sections"] == profiler.summary() and report["step_seconds"] == profiler.step_seconds)
+
+    # A disabled profiler records nothing
+    profiler = StepProfiler(enabled=False)
+    profiler.begin_step()
+    with profiler.section("steering seek"):
+        pass
+    profiler.end_step()
+    results.append(profiler.section("io") is disabled_section and not profiler.seconds and not profiler.step_seconds)
+
+    return results
+
+
+if __name__ == "__main__":
+    # support_test runs only when this script is run directly, and not when imported as a module
+    results = support_test()
+    for idx, result in enumerate(results):
+        print(f"Test {idx+1} {'PASSED' if result else 'FAILED'}")
@@ -1,6 +1,7 @@
 # Author: Isaiah Harville
 # Purpose: Provide support for the Dynamic Movement Algorithms.
 
+import math
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -20,6 +21,22 @@ def normalize(vector):
     else:
         return np.array([0, 0], dtype=np.float64)
 
+# Dot products of two arrays of 2D vectors, row by row; matches dotProduct() bit for bit.
+def dotProducts(vectors1, vectors2):
+    return np.matmul(vectors1[..., None, :], vectors2[..., :, None])[..., 0, 0]
+
+# Magnitudes of an array of 2D vectors, one per row; matches magnitude() bit for bit.
+def magnitudes(vectors):
+    return np.sqrt(dotProducts(vectors, vectors))
+
+# Normalize an array of 2D vectors, one per row; zero-length rows stay zero.
+def normalizeRows(vectors):
+    vectorMagnitudes = magnitudes(vectors)
+    result = np.zeros(vectors.shape, dtype=np.float64)
+    nonzero = vectorMagnitudes != 0
+    result[nonzero] = vectors[nonzero] / vectorMagnitudes[nonzero, None]
+    return result
+
 # Calculate the dot product of two 2D vectors
 def dotProduct(vector1, vector2):
     return np.dot(vector1, vector2)
@@ -28,6 +45,10 @@ def dotProduct(vector1, vector2):
 def orientationToVector(orientation):
     return np.array([np.cos(orientation), np.sin(orientation)])
 
+# Convert an array of radian orientations to unit vectors, one per row.
+def orientationVectors(orientations):
+    return np.column_stack([np.cos(orientations), np.sin(orientations)])
+
 # Calculate distance between two 2D points
 def distancePntToPnt(A, B):
     return np.linalg.norm(np.subtract(B, A))
@@ -67,24 +88,160 @@ def convertAngle(theta):
         theta = theta - (2 * np.pi * np.sign(theta))
     return theta
 
+# Convert an array of radian angles to the interval (-pi, pi), as convertAngle does.
+def convertAngles(thetas):
+    thetas = thetas % (2 * np.pi)
+    return np.where(np.abs(thetas) > np.pi, thetas - (2 * np.pi * np.sign(thetas)), thetas)
+
+
+## 2D Vector Fast Path ##
+
+# Plain-float 2D vector for the per-character movement path. Length-2 NumPy arrays carry a large
+# fixed cost per operation; Vec2 does the same geometry with Python floats, agreeing with the
+# NumPy functions above to within rounding.
+class Vec2:
+    __slots__ = ('x', 'z')
+
+    def __init__(self, x=0.0, z=0.0):
+        self.x = x
+        self.z = z
+
+    # Convert from any length-2 sequence, such as a NumPy array.
+    @classmethod
+    def of(cls, vector):
+        x, z = vector
+        return cls(float(x), float(z))
+
+    def array(self):
+        return np.array([self.x, self.z], dtype=np.float64)
+
+    def __add__(self, other):
+        return Vec2(self.x + other.x, self.z + other.z)
+
+    def __sub__(self, other):
+        return Vec2(self.x - other.x, self.z - other.z)
+
+    def __mul__(self, scalar):
+        return Vec2(self.x * scalar, self.z * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vec2(self.x / scalar, self.z / scalar)
+
+    def __neg__(self):
+        return Vec2(-self.x, -self.z)
+
+    def __iter__(self):
+        yield self.x
+        yield self.z
+
+    def __eq__(self, other):
+        return self.x == other.x and self.z == other.z
+
+    def __repr__(self):
+        return f"Vec2({self.x}, {self.z})"
+
+    def dot(self, other):
+        return self.x * other.x + self.z * other.z
+
+    def magnitude(self):
+        return math.sqrt(self.x * self.x + self.z * self.z)
+
+    def normalize(self):
+        vectorMagnitude = self.magnitude()
+        if vectorMagnitude:
+            return Vec2(self.x / vectorMagnitude, self.z / vectorMagnitude)
+        else:
+            return Vec2(0.0, 0.0)
+
+    def distance(self, other):
+        dx, dz = other.x - self.x, other.z - self.z
+        return math.sqrt(dx * dx + dz * dz)
+
+# Vec2 version of closestPointLine.
+def closestPointLineVec2(Q, A, B):
+    AB = B - A
+    T = (Q - A).dot(AB) / AB.dot(AB)
+    return A + T * AB
+
+# Vec2 version of closestPointSegment. A zero-length segment has no closest point (NaN), as there.
+def closestPointSegmentVec2(Q, A, B):
+    AB = B - A
+    lengthSquared = AB.dot(AB)
+    if not lengthSquared:
+        return Vec2(math.nan, math.nan)
+    T = (Q - A).dot(AB) / lengthSquared
+
+    if T < 0:
+        return A
+    elif T > 1:
+        return B
+
+    return A + T * AB
+
+
+## Spatial Hashing ##
+
+# Find candidate pairs of nearby points with a uniform grid of square cells.
+# Returns index arrays (i, j), i < j, of every pair in the same or adjacent cells, so every
+# pair closer than cell_size is included; callers test the candidates exactly.
+# Points with different groups, such as ensemble members, are never paired.
+def neighborPairs(positions, cell_size, groups=None):
+    count = len(positions)
+    if count < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1 # Keep every neighboring cell coordinate non-negative
+    width = cells[:, 1].max() + 2
+    keys = cells[:, 0] * width + cells[:, 1]
+    if groups is not None:
+        keys += groups * ((cells[:, 0].max() + 2) * width)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+
+    pairs_i, pairs_j = [], []
+    for dx, dz in [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]: # Own cell plus half of the neighbors
+        neighbor_keys = keys + dx * width + dz
+        end = np.searchsorted(sorted_keys, neighbor_keys, side='right')
+        if dx == 0 and dz == 0:
+            start = rank + 1 # Only points after this one in its own cell
+        else:
+            start = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+
+        counts = np.maximum(end - start, 0)
+        total = counts.sum()
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        pairs_i.append(np.repeat(np.arange(count), counts))
+        pairs_j.append(order[np.repeat(start, counts) + offsets])
+
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    return np.minimum(i, j), np.maximum(i, j)
+
 
 ## Path Functions ##
 
 # Assemble a complete path datastructure form its coordinates.
 import numpy as np
 
+# Besides the coordinates, distances and params, the path holds everything path queries reuse:
+# its vertices, each segment's vector, length and squared length, the vertices as Vec2 points,
+# and the segment grid.
 def createPath(pathID, path_x, path_y):
     path_x, path_y = np.array(path_x), np.array(path_y)
     
     path_segments = len(path_x) - 1
+    vertices = np.column_stack([path_x, path_y]).astype(np.float64)
+    segment_vectors = vertices[1:] - vertices[:-1]
+    segment_lengths_squared = dotProducts(segment_vectors, segment_vectors)
+    segment_lengths = np.sqrt(segment_lengths_squared)
     
-    pathDistance = np.zeros(path_segments + 1)
-    for i in range(1, path_segments + 1):
-        pathDistance[i] = pathDistance[i - 1] + distancePntToPnt([path_x[i - 1], path_y[i - 1]], [path_x[i], path_y[i]])
-    
-    path_param = np.zeros(path_segments + 1)
-    for i in range(1, path_segments + 1):
-        path_param[i] = pathDistance[i] / np.max(pathDistance)
+    pathDistance = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+    path_param = pathDistance / pathDistance.max()
     
     return {
         'id': pathID,
@@ -92,49 +249,439 @@ def createPath(pathID, path_x, path_y):
         'y': path_y,
         'distance': pathDistance,
         'param': path_param,
-        'segments': path_segments
+        'segments': path_segments,
+        'vertices': vertices,
+        'segment_vectors': segment_vectors,
+        'segment_lengths': segment_lengths,
+        'segment_lengths_squared': segment_lengths_squared,
+        'points': [Vec2(float(x), float(y)) for x, y in vertices],
+        'grid': createPathGrid(vertices)
     }
 
+# Build a uniform grid over a path's segments, so closest segment searches only visit nearby cells.
+# Each segment is listed in every cell it passes through; cell k's segments are
+# segments[start[k]:start[k + 1]], and table holds the running totals of those counts over both
+# grid axes, so the number of entries in any box of cells is four lookups. Cells are about one
+# average segment long.
+def createPathGrid(vertices):
+    A, B = vertices[:-1], vertices[1:]
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+
+    lengths = magnitudes(B - A)
+    cell_size = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+    cell_size = max(cell_size, float((high - low).max()) / 1024) # Bound the number of cells
+    shape = np.floor((high - low) / cell_size).astype(np.int64) + 1
+
+    # Split each segment where it crosses grid lines; each piece lies in one cell, found from its
+    # midpoint. Pieces whose midpoints round into a neighboring cell are covered by the one cell
+    # of slack in pathSegmentRings' distance bounds.
+    a, b = (A - low) / cell_size, (B - low) / cell_size
+    first, last = np.floor(np.minimum(a, b)), np.floor(np.maximum(a, b))
+    crossings = (last - first).astype(np.int64)
+    pieces = [np.arange(len(A)), np.arange(len(A))]
+    params = [np.zeros(len(A)), np.ones(len(A))]
+    for axis in range(2):
+        segment = np.repeat(np.arange(len(A)), crossings[:, axis])
+        line = np.arange(len(segment)) - np.repeat(np.cumsum(crossings[:, axis]) - crossings[:, axis], crossings[:, axis])
+        pieces.append(segment)
+        params.append((first[segment, axis] + 1 + line - a[segment, axis]) / (b[segment, axis] - a[segment, axis]))
+
+    segment, param = np.concatenate(pieces), np.concatenate(params)
+    order = np.lexsort((param, segment))
+    segment, param = segment[order], param[order]
+    same = segment[1:] == segment[:-1]
+    segment, middle = segment[:-1][same], ((param[:-1] + param[1:]) / 2)[same]
+    cell = np.floor(a[segment] + middle[:, None] * (b[segment] - a[segment])).astype(np.int64)
+    cell = np.clip(cell, 0, shape - 1)
+
+    # One entry per segment and cell, ordered by cell and then segment.
+    keys = np.unique((cell[:, 0] * shape[1] + cell[:, 1]) * len(A) + segment)
+    cells, segments = keys // max(len(A), 1), keys % max(len(A), 1)
+    start = np.searchsorted(cells, np.arange(shape[0] * shape[1] + 1))
+
+    table = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = np.diff(start).reshape(shape).cumsum(axis=0).cumsum(axis=1)
+    return {'origin': low, 'cell_size': cell_size, 'shape': shape, 'start': start, 'segments': segments, 'table': table}
+
+# Cells of a grid in the square ring of cells ring steps from cell (cx, cz), clipped to the grid.
+def gridRingCells(shape, cx, cz, ring):
+    if ring == 0:
+        return np.array([cx * shape[1] + cz])
+
+    xs = np.arange(max(cx - ring, 0), min(cx + ring, shape[0] - 1) + 1)
+    zs = np.arange(max(cz - ring + 1, 0), min(cz + ring - 1, shape[1] - 1) + 1)
+    cells = [np.empty(0, dtype=np.int64)]
+    for z in (cz - ring, cz + ring):
+        if 0 <= z < shape[1]:
+            cells.append(xs * shape[1] + z)
+    for x in (cx - ring, cx + ring):
+        if 0 <= x < shape[0]:
+            cells.append(x * shape[1] + zs)
+    return np.concatenate(cells)
+
+# Yield the path's segments ring by ring outward from position's grid cell, each ring with a lower
+# bound on the distance from position to its segments. A search can stop at the first ring whose
+# bound exceeds the closest distance found so far. Segments may repeat across rings.
+# Positions more than two rings outside the grid would visit the rings across the whole grid one
+# at a time, so they get every segment at once instead.
+def pathSegmentRings(path, position):
+    grid = path['grid']
+    shape, cell_size, start = grid['shape'], grid['cell_size'], grid['start']
+    cx, cz = np.floor((np.asarray(position, dtype=np.float64) - grid['origin']) / cell_size).astype(np.int64)
+
+    # Rings from the nearest one touching the grid to the one covering all of it
+    first_ring = max(0, -cx, cx - (shape[0] - 1), -cz, cz - (shape[1] - 1))
+    last_ring = max(abs(cx), abs(shape[0] - 1 - cx), abs(cz), abs(shape[1] - 1 - cz))
+
+    if first_ring > 2:
+        yield 0.0, np.arange(path['segments'])
+        return
+
+    for ring in range(first_ring, last_ring + 1):
+        cells = gridRingCells(shape, cx, cz, ring)
+        counts = start[cells + 1] - start[cells]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        # Cells in ring r are at least (r - 1) cells away; one more cell of slack covers rounding
+        # at cell boundaries.
+        yield (ring - 2) * cell_size, grid['segments'][np.repeat(start[cells], counts) + offsets]
+
+# Segment of the path holding each parameter: the last one starting below it, found by binary
+# search. Parameters at or before the start of the path use the first segment, and parameters past
+# the end use the last.
+def pathParamSegments(path, params):
+    segments = np.searchsorted(path['param'], params, side='left') - 1
+    return np.clip(segments, 0, path['segments'] - 1)
+
 # Calculate position on a path corresponding to a given parameter.
 def getPathPosition(path, param):
-    i = np.max(np.where(param > path['param'])[0])
-    
-    A = np.array([path['x'][i], path['y'][i]], dtype=np.float64)
-    B = np.array([path['x'][i + 1], path['y'][i + 1]], dtype=np.float64)
+    i = min(max(int(np.searchsorted(path['param'], param)) - 1, 0), path['segments'] - 1)
     
     T = (param - path['param'][i]) / (path['param'][i + 1] - path['param'][i])
-    P = A + (T * (B - A))
+    P = path['vertices'][i] + (T * path['segment_vectors'][i])
     
     return P
 
-# Find the path parameter of the point on the path closest to a given position.
-def getPathParam(path, position):
-    closestDistance = np.inf
-    position = np.array(position)
+# Calculate the positions on a path corresponding to an array of parameters, one per row.
+def getPathPositions(path, params):
+    i = pathParamSegments(path, params)
+    A = path['vertices'][i]
     
-    for i in range(path['segments']):
-        A = np.array([path['x'][i], path['y'][i]], dtype=np.float64)
-        B = np.array([path['x'][i + 1], path['y'][i + 1]], dtype=np.float64)
-        
-        checkPoint = closestPointSegment(position, A, B)
-        checkDistance = distancePntToPnt(position, checkPoint)
-        
-        if checkDistance < closestDistance:
-            closest_point = checkPoint
-            closestDistance = checkDistance
-            closestSegment = i
-            
-    # Calculate path parameter of closest point
-    A = np.array([path['x'][closestSegment], path['y'][closestSegment]], dtype=np.float64)
-    A_param = path['param'][closestSegment]
-    B = np.array([path['x'][closestSegment + 1], path['y'][closestSegment + 1]], dtype=np.float64)
-    B_param = path['param'][closestSegment + 1]
-    C = closest_point
-    T = magnitude(C - A) / magnitude(B - A)
-    C_param = A_param + (T * (B_param - A_param))
+    T = (params - path['param'][i]) / (path['param'][i + 1] - path['param'][i])
+    P = A + (T[:, None] * path['segment_vectors'][i])
     
-    return C_param
+    return P
 
+# Closest point to position on each of the given path segments, one per row; matches
+# closestPointSegment() bit for bit. An array of positions broadcasts against the segments.
+def closestPathSegmentPoints(path, position, segments):
+    A = path['vertices'][segments]
+    AB = path['segment_vectors'][segments]
+    T = dotProducts(position - A, AB) / path['segment_lengths_squared'][segments]
+    points = A + T[..., None] * AB
+    points = np.where((T < 0)[..., None], A, points)
+    return np.where((T > 1)[..., None], path['vertices'][segments + 1], points)
+
+# Find the segment and point on the path closest to a given position.
+# Only segments in grid cells near the position are checked; ties go to the lowest segment, as
+# in a scan over every segment.
+def closestPathPoint(path, position):
+    closestDistance = np.inf
+    closestSegment = None
+    position = np.array(position, dtype=np.float64)
+
+    for bound, segments in pathSegmentRings(path, position):
+        if bound > closestDistance:
+            break
+        if len(segments) == 0:
+            continue
+
+        # Closest of this ring's segments, the lowest one on ties; NaN distances are never closest.
+        checkPoints = closestPathSegmentPoints(path, position, segments)
+        checkDistances = magnitudes(checkPoints - position)
+        ringDistance = np.min(checkDistances, initial=np.inf, where=~np.isnan(checkDistances))
+        if ringDistance > closestDistance or ringDistance == np.inf:
+            continue
+
+        tied = np.flatnonzero(checkDistances == ringDistance)
+        k = tied[np.argmin(segments[tied])]
+        if ringDistance < closestDistance or segments[k] < closestSegment:
+            closest_point = checkPoints[k]
+            closestDistance = ringDistance
+            closestSegment = segments[k]
+
+    return closestSegment, closest_point
+
+# Calculate path parameter of a point on one of the path's segments.
+def segmentPointParam(path, segment, point):
+    A_param = path['param'][segment]
+    B_param = path['param'][segment + 1]
+    T = magnitude(point - path['vertices'][segment]) / path['segment_lengths'][segment]
+    return A_param + (T * (B_param - A_param))
+
+# Find the path parameter of the point on the path closest to a given position.
+def getPathParam(path, position):
+    segment, point = closestPathPoint(path, position)
+    return segmentPointParam(path, segment, point)
+
+# Segments to search around a follower's last segment, from trackPathParam.
+def pathWindow(path, segment, window):
+    return range(max(0, segment - window), min(path['segments'], segment + window + 1))
+
+# Whether the closest segment in a window may not be the closest nearby: it lies on the window's
+# edge with more path beyond it.
+def leftPathWindow(path, segments, closestSegment):
+    return (closestSegment == segments[0] and segments[0] > 0) or (closestSegment == segments[-1] and segments[-1] < path['segments'] - 1)
+
+# Number of times trackPathParam moves its window along the path before searching all of it.
+path_window_moves = 4
+
+# Path parameter for a path follower, tracked from step to step. Only segments within window of
+# the follower's last segment are searched. When the closest one is on the window's edge, the
+# window moves to center on it, up to path_window_moves times, before falling back to the full
+# search; the full search also runs on the first step (segment -1) and when window is 0. Near a
+# point where the path passes close to itself, a follower keeps to the part of the path it is on.
+# Returns the path parameter and the closest segment, to pass back in on the next step.
+def trackPathParam(path, position, segment, window):
+    position = np.array(position, dtype=np.float64)
+
+    if segment >= 0 and window > 0:
+        for move in range(path_window_moves):
+            segments = pathWindow(path, segment, window)
+            indices = np.arange(segments.start, segments.stop)
+            checkPoints = closestPathSegmentPoints(path, position, indices)
+            checkDistances = magnitudes(checkPoints - position)
+            if np.isnan(checkDistances).all():
+                break
+
+            k = np.nanargmin(checkDistances)
+            if not leftPathWindow(path, segments, indices[k]):
+                return segmentPointParam(path, indices[k], checkPoints[k]), int(indices[k])
+            segment = indices[k]
+
+    closestSegment, closest_point = closestPathPoint(path, position)
+    return segmentPointParam(path, closestSegment, closest_point), int(closestSegment)
+
+# Segment pairs checked at once by closestPathPoints, bounding the memory it uses.
+path_chunk_pairs = 1 << 18
+
+# Closest segment and point for each row of positions, among that row's candidate segments;
+# -1 pads rows with fewer candidates. Ties go to the first candidate, and rows whose candidates
+# have no closest point get segment -1.
+def closestPathCandidates(path, positions, candidates):
+    valid = candidates >= 0
+    segments = np.where(valid, candidates, 0)
+    checkPoints = closestPathSegmentPoints(path, positions[:, None, :], segments)
+    checkDistances = magnitudes(checkPoints - positions[:, None, :])
+    checkDistances[~valid | np.isnan(checkDistances)] = np.inf
+
+    rows = np.arange(len(positions))
+    k = np.argmin(checkDistances, axis=1)
+    found = np.isfinite(checkDistances[rows, k])
+    return np.where(found, segments[rows, k], -1), checkPoints[rows, k]
+
+# Grid cells within rings of each row of positions' cell, clipped to the grid, as the lowest and
+# highest cell on each axis, and the number of segment entries listed in those cells.
+def pathGridBoxes(grid, positions, rings):
+    cells = np.floor((positions - grid['origin']) / grid['cell_size']).astype(np.int64)
+    low = np.maximum(cells - rings[:, None], 0)
+    high = np.minimum(cells + rings[:, None], grid['shape'] - 1)
+    empty = (low > high).any(axis=1)
+    low[empty], high[empty] = 0, -1
+
+    table = grid['table']
+    entries = table[high[:, 0] + 1, high[:, 1] + 1] - table[low[:, 0], high[:, 1] + 1] - table[high[:, 0] + 1, low[:, 1]] + table[low[:, 0], low[:, 1]]
+    return low, high, np.where(empty, 0, entries)
+
+# Candidate segments for each row from the grid cells in its box, sorted and without repeats,
+# with -1 padding rows to the same length, for closestPathCandidates.
+def pathGridCandidates(grid, low, high):
+    spans = high - low + 1
+    cellCounts = spans[:, 0] * spans[:, 1]
+    row = np.repeat(np.arange(len(low)), cellCounts)
+    offsets = np.arange(len(row)) - np.repeat(np.cumsum(cellCounts) - cellCounts, cellCounts)
+    cells = (low[row, 0] + offsets % spans[row, 0]) * grid['shape'][1] + low[row, 1] + offsets // spans[row, 0]
+
+    start = grid['start']
+    counts = start[cells + 1] - start[cells]
+    row = np.repeat(row, counts)
+    offsets = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts)
+    segments = grid['segments'][np.repeat(start[cells], counts) + offsets]
+
+    order = np.lexsort((segments, row))
+    row, segments = row[order], segments[order]
+    first = np.ones(len(row), dtype=bool)
+    first[1:] = (row[1:] != row[:-1]) | (segments[1:] != segments[:-1])
+    row, segments = row[first], segments[first]
+    rowCounts = np.bincount(row, minlength=len(low))
+    candidates = np.full((len(low), max(rowCounts.max(initial=0), 1)), -1, dtype=np.int64)
+    candidates[row, np.arange(len(row)) - np.repeat(np.cumsum(rowCounts) - rowCounts, rowCounts)] = segments
+    return candidates
+
+# Split rows into chunks whose padded candidate matrices hold about path_chunk_pairs entries,
+# sorting rows by their number of candidates so rows of similar width share a chunk. chunk, if
+# given, also caps the rows per chunk.
+def pathChunks(rows, widths, chunk=None):
+    order = np.argsort(widths, kind='stable')
+    rows, widths = rows[order], np.maximum(widths[order], 1)
+    start = 0
+    while start < len(rows):
+        sizes = np.arange(1, len(rows) - start + 1) * widths[start:]
+        stop = start + max(1, int(np.searchsorted(sizes, path_chunk_pairs, side='right')))
+        if chunk:
+            stop = min(stop, start + chunk)
+        yield rows[start:stop]
+        start = stop
+
+# Closest segment and point on the path for each row of positions, as closestPathPoint finds
+# them. Each position is first checked against the segments in the grid cells within two rings
+# of its own; when the closest distance found leaves nearer segments possible beyond those
+# cells, the box widens to the rings that distance calls for. Positions whose boxes would hold
+# more entries than the path has segments, such as those far from the path, check every segment.
+# Each check is one array operation over a chunk of positions, bounded by path_chunk_pairs.
+# Ties go to the lowest segment, as in closestPathPoint.
+def closestPathPoints(path, positions, chunk=None):
+    positions = np.asarray(positions, dtype=np.float64)
+    grid = path['grid']
+    segments = np.full(len(positions), -1, dtype=np.int64)
+    points = np.zeros((len(positions), 2), dtype=np.float64)
+
+    rows = np.arange(len(positions))
+    rings = np.full(len(positions), 2, dtype=np.int64)
+    for attempt in range(2):
+        low, high, entries = pathGridBoxes(grid, positions[rows], rings)
+        near = entries <= path['segments']
+        rows, rings, low, high, entries = rows[near], rings[near], low[near], high[near], entries[near]
+
+        found = np.full(len(rows), -1, dtype=np.int64)
+        foundPoints = np.zeros((len(rows), 2), dtype=np.float64)
+        for part in pathChunks(np.arange(len(rows)), entries, chunk):
+            candidates = pathGridCandidates(grid, low[part], high[part])
+            found[part], foundPoints[part] = closestPathCandidates(path, positions[rows[part]], candidates)
+
+        # Segments beyond ring r are at least (r - 1) cells away, as in pathSegmentRings.
+        distances = np.where(found >= 0, magnitudes(foundPoints - positions[rows]), np.inf)
+        complete = (rings - 1) * grid['cell_size'] > distances
+        segments[rows[complete]], points[rows[complete]] = found[complete], foundPoints[complete]
+
+        rows, distances = rows[~complete], distances[~complete]
+        rings = np.floor(np.minimum(distances, 4 * grid['cell_size'] * grid['shape'].max()) / grid['cell_size']).astype(np.int64) + 2
+
+    # Everything not settled by the grid: check every segment.
+    rows = np.flatnonzero(segments < 0)
+    candidates = np.arange(path['segments'])
+    for part in pathChunks(rows, np.full(len(rows), path['segments']), chunk):
+        segments[part], points[part] = closestPathCandidates(path, positions[part], np.broadcast_to(candidates, (len(part), len(candidates))))
+
+    return segments, points
+
+# Calculate path parameters of points on the path's segments, one per row.
+def segmentPointParams(path, segments, points):
+    A_param = path['param'][segments]
+    B_param = path['param'][segments + 1]
+    T = magnitudes(points - path['vertices'][segments]) / path['segment_lengths'][segments]
+    return A_param + (T * (B_param - A_param))
+
+# Find the path parameters of the points on the path closest to each row of positions, for many
+# characters following one path. Returns the parameters and the closest points.
+def getPathParams(path, positions, chunk=None):
+    segments, points = closestPathPoints(path, positions, chunk)
+    return segmentPointParams(path, segments, points), points
+
+# trackPathParam for many characters following one path: one window search per window move for
+# all of them, then one full search for those not settled in their windows.
+# Returns the path parameters and the closest segments, to pass back in on the next step.
+def trackPathParams(path, positions, segments, windows):
+    positions = np.asarray(positions, dtype=np.float64)
+    segments = np.array(segments, dtype=np.int64)
+    points = np.zeros((len(positions), 2), dtype=np.float64)
+    settled = np.zeros(len(positions), dtype=bool)
+    searching = (segments >= 0) & (windows > 0)
+    offsets = np.arange(-windows.max(initial=0), windows.max(initial=0) + 1)
+
+    for move in range(path_window_moves):
+        rows = np.flatnonzero(searching)
+        if len(rows) == 0:
+            break
+
+        low = np.maximum(0, segments[rows] - windows[rows])
+        high = np.minimum(path['segments'] - 1, segments[rows] + windows[rows])
+        candidates = segments[rows, None] + offsets
+        candidates[(candidates < low[:, None]) | (candidates > high[:, None])] = -1
+        closest, closestPoints = closestPathCandidates(path, positions[rows], candidates)
+
+        left = ((closest == low) & (low > 0)) | ((closest == high) & (high < path['segments'] - 1))
+        kept = (closest >= 0) & ~left
+        settled[rows[kept]] = True
+        points[rows[kept]] = closestPoints[kept]
+        segments[rows[closest >= 0]] = closest[closest >= 0]
+        searching[rows[kept | (closest < 0)]] = False
+
+    rows = np.flatnonzero(~settled)
+    if len(rows):
+        segments[rows], points[rows] = closestPathPoints(path, positions[rows])
+
+    return segmentPointParams(path, segments, points), segments
+
+# Vec2 version of closestPathPoint, for the per-character movement path.
+def closestPathPointVec2(path, position):
+    closestDistance = math.inf
+    closestSegment = None
+    position = Vec2.of(position)
+    points = path['points']
+
+    for bound, segments in pathSegmentRings(path, (position.x, position.z)):
+        if bound > closestDistance:
+            break
+
+        for i in segments.tolist():
+            checkPoint = closestPointSegmentVec2(position, points[i], points[i + 1])
+            checkDistance = position.distance(checkPoint)
+
+            if checkDistance < closestDistance or (checkDistance == closestDistance and i < closestSegment):
+                closest_point = checkPoint
+                closestDistance = checkDistance
+                closestSegment = i
+
+    return closestSegment, closest_point
+
+# Vec2 version of segmentPointParam.
+def segmentPointParamVec2(path, segment, point):
+    A_param, B_param = path['param'][segment], path['param'][segment + 1]
+    T = (point - path['points'][segment]).magnitude() / path['segment_lengths'][segment]
+    return A_param + (T * (B_param - A_param))
+
+# Vec2 version of getPathParam.
+def getPathParamVec2(path, position):
+    segment, point = closestPathPointVec2(path, position)
+    return segmentPointParamVec2(path, segment, point)
+
+# Vec2 version of trackPathParam.
+def trackPathParamVec2(path, position, segment, window):
+    position = Vec2.of(position)
+    points = path['points']
+
+    if segment >= 0 and window > 0:
+        for move in range(path_window_moves):
+            segments = pathWindow(path, segment, window)
+            closestDistance = math.inf
+            closestSegment = None
+            for i in segments:
+                checkPoint = closestPointSegmentVec2(position, points[i], points[i + 1])
+                checkDistance = position.distance(checkPoint)
+                if checkDistance < closestDistance:
+                    closest_point = checkPoint
+                    closestDistance = checkDistance
+                    closestSegment = i
+
+            if closestSegment is None:
+                break
+            if not leftPathWindow(path, segments, closestSegment):
+                return segmentPointParamVec2(path, closestSegment, closest_point), closestSegment
+            segment = closestSegment
+
+    closestSegment, closest_point = closestPathPointVec2(path, position)
+    return segmentPointParamVec2(path, closestSegment, closest_point), closestSegment
 
 ## Dynamic Movement Functions ##
 
@@ -161,11 +708,98 @@ def closest_approach(A_position, A_velocity, B_position, B_velocity):
     
     return closest_t, closest_d, closest_A, closest_B
 
+# Batched closest_approach for the pairs of points with indices i and j.
+def closest_approach_pairs(positions, velocities, i, j):
+    d_p = positions[j] - positions[i]
+    d_v = velocities[j] - velocities[i]
+    d_v_magnitude = magnitudes(d_v)
+    moving = d_v_magnitude != 0
+
+    closest_t = np.zeros(len(i), dtype=np.float64)
+    closest_t[moving] = -dotProducts(d_p[moving], d_v[moving]) / np.float_power(d_v_magnitude[moving], 2)
+    closest_A = positions[i] + (velocities[i] * closest_t[:, None])
+    closest_B = positions[j] + (velocities[j] * closest_t[:, None])
+    closest_d = magnitudes(closest_B - closest_A)
+
+    return closest_t, closest_d, closest_A, closest_B
+
+# Closest approach for every pair of points that could come within radius of each other
+# within horizon time; radius and horizon are scalars or one value per point.
+# Pairs are pruned by a spatial hash and by how far apart their speeds let them close.
+def closest_approach_all(positions, velocities, radius, horizon, groups=None):
+    radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), len(positions))
+    horizon = np.broadcast_to(np.asarray(horizon, dtype=np.float64), len(positions))
+    speeds = magnitudes(velocities)
+
+    reach = radius.max(initial=0) + 2 * speeds.max(initial=0) * horizon.max(initial=0)
+    i, j = neighborPairs(positions, reach or 1.0, groups)
+    closing = (speeds[i] + speeds[j]) * np.maximum(horizon[i], horizon[j])
+    near = magnitudes(positions[j] - positions[i]) <= np.maximum(radius[i], radius[j]) + closing
+    i, j = i[near], j[near]
+
+    closest_t, closest_d, closest_A, closest_B = closest_approach_pairs(positions, velocities, i, j)
+    return i, j, closest_t, closest_d, closest_A, closest_B
+
 
 ## Mathematics Functions ##
 
-def randomBinomial():
-    return np.random.uniform(0, 1) - np.random.uniform(0, 1)
+# Random number in (-1, 1), more likely near 0; rng is a np.random.Generator, or the global
+# NumPy random state by default.
+def randomBinomial(rng=np.random):
+    return rng.uniform(0, 1) - rng.uniform(0, 1)
+
+# Random number generator for one character. Its stream depends only on the seed and the
+# character's id, so a run gives the same numbers in any process and in either engine.
+def characterGenerator(seed, character_id):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(int(character_id),)))
+
+# Per-character random streams for a crowd, drawn in blocks. Each character's randomBinomial
+# values come from its own characterGenerator, in the same order as calling randomBinomial on it,
+# but block values at a time; a step then costs one array lookup for the whole crowd.
+# Generators and value rows are only made for characters that draw, in the order they first do.
+# The first block of the k-th drawer is cut short by k % block values, so refills are staggered:
+# about 1/block of the drawers refill on each step instead of all of them every block steps.
+# A character's first draw still creates its generator, which is the cost of a first step.
+class RandomStreams:
+    def __init__(self, seed, ids, block=64):
+        self.seed = seed
+        self.ids = ids
+        self.block = block
+        self.generators = []
+        self.slots = np.full(len(ids), -1, dtype=np.int64) # Value row of each character, -1 until it draws
+        self.values = np.zeros((0, block), dtype=np.float64)
+        self.cursor = np.zeros(0, dtype=np.int64)
+
+    # Next randomBinomial value of each character in rows.
+    def binomials(self, rows):
+        new = rows[self.slots[rows] < 0]
+        if len(new):
+            self.add(new)
+
+        slots = self.slots[rows]
+        for slot in slots[self.cursor[slots] == self.block].tolist():
+            self.refill(slot, 0)
+
+        values = self.values[slots, self.cursor[slots]]
+        self.cursor[slots] += 1
+        return values
+
+    # Give each character in rows a generator and a value row, with its first, staggered, block.
+    def add(self, rows):
+        first = len(self.generators)
+        slots = np.arange(first, first + len(rows))
+        self.slots[rows] = slots
+        self.values = np.concatenate([self.values, np.zeros((len(rows), self.block), dtype=np.float64)])
+        self.cursor = np.concatenate([self.cursor, np.zeros(len(rows), dtype=np.int64)])
+        for slot, row in zip(slots.tolist(), rows.tolist()):
+            self.generators.append(characterGenerator(self.seed, self.ids[row]))
+            self.refill(slot, slot % self.block)
+
+    # Fill a value row from start to its end with the next values of its generator.
+    def refill(self, slot, start):
+        uniform = self.generators[slot].random(2 * (self.block - start))
+        self.values[slot, start:] = uniform[0::2] - uniform[1::2]
+        self.cursor[slot] = start
 
 
 ## Plotting Functions ##
@@ -257,6 +891,55 @@ def support_test():
     results.append(np.array_equal(Sl, closestPointLine(Q, A, B)))
     results.append(np.array_equal(Ss, closestPointSegment(Q, A, B)))
 
+    # Vec2 versions of the closest point functions agree with the NumPy versions on test cases 1-7
+    cases = [([-6, 3], [-8, 5], [-4, 5]), ([3, 3], [1, 2], [1, 6]), ([6, 0], [6, 2], [9, 5]), ([-3, -1], [-8, 1], [-4, 0]),
+             ([-8, -3], [-7, -3], [-5, -3]), ([3, -3], [-1, -3], [2, -3]), ([8, -3], [9, -3], [6, -3])]
+    for Q, A, B in cases:
+        results.append(np.allclose(closestPointLine(Q, A, B), closestPointLineVec2(Vec2(*Q), Vec2(*A), Vec2(*B)).array()))
+        results.append(np.allclose(closestPointSegment(Q, A, B), closestPointSegmentVec2(Vec2(*Q), Vec2(*A), Vec2(*B)).array()))
+
+    # The grid searches of getPathParam, getPathParams and trackPathParams match a scan over every
+    # segment, on random walks, a path with repeated vertices, and a long diagonal among short
+    # segments, for positions near, between and far from the paths
+    rng = np.random.default_rng(330)
+    walk = np.cumsum(rng.normal(size=(300, 2)) * 3, axis=0)
+    repeated = np.round(walk[:60])
+    repeated[10:13] = repeated[9]
+    diagonal = np.vstack([np.column_stack([np.arange(200) * 0.1, np.zeros(200)]), [[500, 500]]])
+    for vertices in [walk, repeated, diagonal]:
+        path = createPath(1, vertices[:, 0], vertices[:, 1])
+        low, high = vertices.min(axis=0), vertices.max(axis=0)
+        positions = np.vstack([rng.uniform(low - 20, high + 20, size=(150, 2)), vertices[rng.integers(0, len(vertices), 20)],
+                               rng.uniform(-1e5, 1e5, size=(10, 2))])
+        scan = []
+        for position in positions:
+            points = closestPathSegmentPoints(path, position, np.arange(path['segments']))
+            distances = magnitudes(points - position)
+            segment = np.flatnonzero(distances == np.nanmin(distances))[0]
+            scan.append(segmentPointParam(path, segment, points[segment]))
+        params, _ = getPathParams(path, positions)
+        results.append(np.array_equal([getPathParam(path, position) for position in positions], scan))
+        results.append(np.array_equal(params, scan))
+        results.append(np.allclose([getPathParamVec2(path, position) for position in positions], scan, rtol=0, atol=1e-12))
+
+        # trackPathParams matches trackPathParam for each follower, and the full search on the first step
+        segments = rng.integers(-1, path['segments'], len(positions))
+        windows = rng.integers(0, 4, len(positions))
+        tracked, trackedSegments = trackPathParams(path, positions, segments, windows)
+        single = [trackPathParam(path, position, segment, window) for position, segment, window in zip(positions, segments, windows)]
+        results.append(np.array_equal(tracked, [param for param, _ in single]) and np.array_equal(trackedSegments, [segment for _, segment in single]))
+        results.append(np.array_equal(trackPathParams(path, positions, np.full(len(positions), -1), windows)[0], scan))
+
+    # neighborPairs finds every pair of points closer than cell_size, and never pairs points of
+    # different groups
+    positions = rng.uniform(-50, 50, size=(400, 2))
+    groups = rng.integers(0, 3, 400)
+    i, j = neighborPairs(positions, 4.0, groups)
+    found = set(zip(i.tolist(), j.tolist()))
+    close = magnitudes(positions[:, None] - positions[None, :]) < 4.0
+    expected = {(a, b) for a, b in zip(*np.nonzero(np.triu(close & (groups[:, None] == groups[None, :]), 1)))}
+    results.append(expected <= found and (groups[i] == groups[j]).all() and (i < j).all())
+
     return results
 
 
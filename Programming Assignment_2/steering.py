@@ -0,0 +1,225 @@
+# Author: Isaiah Harville
+# Purpose: Batched steering behaviors for the crowd engine, computed one behavior group at a time.
+
+import numpy as np
+from src import *
+from profiling import disabled_profiler
+from Init import CONTINUE, STOP, SEEK, FLEE, ARRIVE, WANDER, FOLLOW_PATH, SEPARATE, AVOID_COLLISIONS
+
+# Every kernel takes the crowd, the indices of the characters using that behavior (group),
+# and the crowd-wide linear and angular arrays, and writes the group's rows of those arrays.
+
+
+# Limit each row of vectors to the matching limit, in place.
+def clampRows(vectors, limits):
+    vectorMagnitudes = magnitudes(vectors)
+    exceeded = vectorMagnitudes > limits
+    vectors[exceeded] = (vectors[exceeded] / vectorMagnitudes[exceeded, None]) * limits[exceeded, None]
+    return vectors
+
+# Positions of the group's targets; characters without a target are dropped from the group.
+def target_positions(crowd, group):
+    group = group[crowd.target[group] >= 0]
+    return group, crowd.position[crowd.target[group]]
+
+
+# Continue; keep current linear and angular values.
+def crowd_get_steering_continue(crowd, group, linear, angular):
+    linear[group] = crowd.linear[group]
+    angular[group] = crowd.angular[group]
+
+# Stop; bring characters to a stop, with slowing limited by maximum acceleration.
+def crowd_get_steering_stop(crowd, group, linear, angular):
+    linear[group] = clampRows(-crowd.velocity[group], crowd.max_linear[group])
+    angular[group] = -crowd.rotation[group]
+
+# Align; turn toward an orientation per character, slowing the turn within align_slow of it.
+# Characters within align_radius of their orientation get no angular steering.
+def crowd_align_orientations(crowd, group, orientations, angular):
+    rotation = convertAngles(orientations - crowd.orientation[group])
+    rotation_size = np.abs(rotation)
+    max_rotation = crowd.max_rotation[group]
+    align_slow = crowd.align_slow[group]
+
+    align_rotation = max_rotation.copy()
+    slowing = rotation_size <= align_slow
+    align_rotation[slowing] = max_rotation[slowing] * rotation_size[slowing] / align_slow[slowing]
+    align_rotation = align_rotation * np.sign(rotation)
+
+    result = (align_rotation - crowd.rotation[group]) / crowd.align_time[group]
+    exceeded = np.abs(result) > crowd.max_angular[group]
+    result[exceeded] = crowd.max_angular[group][exceeded] * np.sign(result[exceeded])
+    result[rotation_size < crowd.align_radius[group]] = 0
+    angular[group] = result
+
+# Face; turn toward a position per character. Characters already at their position get no
+# angular steering.
+def crowd_face_positions(crowd, group, positions, angular):
+    direction = positions - crowd.position[group]
+    facing = magnitudes(direction) != 0
+    group, direction = group[facing], direction[facing]
+    crowd_align_orientations(crowd, group, np.arctan2(direction[:, 1], direction[:, 0]), angular)
+
+# Seek toward a position per character, at maximum acceleration.
+def crowd_seek_positions(crowd, group, positions, linear, angular):
+    linear[group] = normalizeRows(positions - crowd.position[group]) * crowd.max_linear[group, None]
+    angular[group] = 0
+
+# Seek; move toward target.
+def crowd_get_steering_seek(crowd, group, linear, angular):
+    group, positions = target_positions(crowd, group)
+    crowd_seek_positions(crowd, group, positions, linear, angular)
+
+# Flee; move away from target.
+def crowd_get_steering_flee(crowd, group, linear, angular):
+    group, positions = target_positions(crowd, group)
+    linear[group] = normalizeRows(crowd.position[group] - positions) * crowd.max_linear[group, None]
+    angular[group] = 0
+
+# Arrive; move toward target, slowing as distance decreases.
+def crowd_get_steering_arrive(crowd, group, linear, angular):
+    group, positions = target_positions(crowd, group)
+    direction = positions - crowd.position[group]
+    distance = magnitudes(direction)
+    max_velocity = crowd.max_velocity[group]
+    arrive_slow = crowd.arrive_slow[group]
+
+    arrive_speed = max_velocity.copy()
+    slowing = distance <= arrive_slow
+    arrive_speed[slowing] = max_velocity[slowing] * distance[slowing] / arrive_slow[slowing]
+    arrive_speed[distance < crowd.arrive_radius[group]] = 0
+
+    arrive_velocity = normalizeRows(direction) * arrive_speed[:, None]
+    result = (arrive_velocity - crowd.velocity[group]) / crowd.arrive_time[group, None]
+    linear[group] = clampRows(result, crowd.max_linear[group])
+    angular[group] = 0
+
+# Wander; face a target that drifts randomly around a circle ahead of each character, while
+# accelerating at maximum along the current orientation. The drift comes from each character's
+# own random stream.
+def crowd_get_steering_wander(crowd, group, linear, angular):
+    crowd.wander_orientation[group] += crowd.random.binomials(group) * crowd.wander_rate[group]
+    target_orientation = crowd.wander_orientation[group] + crowd.orientation[group]
+    heading = orientationVectors(crowd.orientation[group])
+
+    centers = crowd.position[group] + crowd.wander_offset[group, None] * heading
+    targets = centers + crowd.wander_radius[group, None] * orientationVectors(target_orientation)
+    crowd_face_positions(crowd, group, targets, angular)
+    linear[group] = crowd.max_linear[group, None] * heading
+
+# Follow path; seek a point path_offset ahead of each character's closest point on its path.
+# The characters on each path are handled together, and each character's closest segment is
+# kept in path_segment for the next step's search.
+def crowd_get_steering_follow_path(crowd, group, linear, angular):
+    positions = np.zeros((len(group), 2), dtype=np.float64)
+    for path_to_follow in np.unique(crowd.path_to_follow[group]):
+        on_path = crowd.path_to_follow[group] == path_to_follow
+        followers = group[on_path]
+        path = crowd.paths[path_to_follow - 1]
+
+        current_params, crowd.path_segment[followers] = trackPathParams(path, crowd.position[followers], crowd.path_segment[followers], crowd.path_window[followers])
+        target_params = np.minimum(1, current_params + crowd.path_offset[followers])
+        positions[on_path] = getPathPositions(path, target_params)
+
+    crowd_seek_positions(crowd, group, positions, linear, angular)
+
+# Separate; accelerate away from every other character within sep_threshold, with strength
+# sep_decay / distance^2 per neighbor, up to max_linear, and the total limited to max_linear.
+# Neighbors come from a spatial hash with cells as large as the largest sep_threshold, so only
+# characters in nearby cells are checked.
+def crowd_get_steering_separate(crowd, group, linear, angular):
+    separating = np.zeros(crowd.count, dtype=bool)
+    separating[group] = True
+    threshold = np.where(separating, crowd.sep_threshold, 0)
+    i, j = neighborPairs(crowd.position, threshold.max() or 1.0, crowd.ensemble)
+
+    # Each pair is a neighbor of both of its characters; contributions are added in neighbor
+    # order, as in the per-character version.
+    mover = np.concatenate([i, j])
+    other = np.concatenate([j, i])
+    order = np.lexsort((other, mover))
+    mover, other = mover[order], other[order]
+    direction = crowd.position[mover] - crowd.position[other]
+    distance = magnitudes(direction)
+
+    near = separating[mover] & (distance < threshold[mover]) & (distance > 0)
+    mover, direction, distance = mover[near], direction[near], distance[near]
+    strength = np.minimum(crowd.sep_decay[mover] / (distance * distance), crowd.max_linear[mover])
+    np.add.at(linear, mover, strength[:, None] * normalizeRows(direction))
+
+    linear[group] = clampRows(linear[group], crowd.max_linear[group])
+    angular[group] = 0
+
+# Avoid collisions; find each character's earliest predicted collision within col_lookahead time,
+# the closest approach that comes within avoid_radius, and accelerate away from the other character's
+# position at that time. Characters with no predicted collision get no steering.
+def crowd_get_steering_avoid_collisions(crowd, group, linear, angular):
+    avoiding = np.zeros(crowd.count, dtype=bool)
+    avoiding[group] = True
+    horizon = np.where(avoiding, crowd.col_lookahead, 0)
+    i, j, closest_t, closest_d, closest_A, closest_B = closest_approach_all(crowd.position, crowd.velocity, crowd.avoid_radius, horizon, crowd.ensemble)
+
+    # Each pair is a possible collision for both of its characters.
+    mover = np.concatenate([i, j])
+    other = np.concatenate([j, i])
+    closest_t = np.concatenate([closest_t, closest_t])
+    closest_d = np.concatenate([closest_d, closest_d])
+    away = np.concatenate([closest_A - closest_B, closest_B - closest_A])
+
+    threat = avoiding[mover] & (closest_t > 0) & (closest_t <= crowd.col_lookahead[mover]) & (closest_d <= crowd.avoid_radius[mover])
+    mover, other, closest_t, away = mover[threat], other[threat], closest_t[threat], away[threat]
+
+    # Keep the earliest collision for each character.
+    order = np.lexsort((closest_t, mover))
+    first = order[np.unique(mover[order], return_index=True)[1]]
+    mover, other, away = mover[first], other[first], away[first]
+
+    # Head-on closest approaches meet at one point; steer away from the other character's current position.
+    head_on = magnitudes(away) == 0
+    away[head_on] = crowd.position[mover[head_on]] - crowd.position[other[head_on]]
+
+    linear[mover] = normalizeRows(away) * crowd.max_linear[mover, None]
+    angular[group] = 0
+
+
+# Steering kernel for each behavior code; crowd_get_steering rejects characters with other codes.
+crowd_steering_behaviors = {
+    CONTINUE: crowd_get_steering_continue,
+    STOP: crowd_get_steering_stop,
+    SEEK: crowd_get_steering_seek,
+    FLEE: crowd_get_steering_flee,
+    ARRIVE: crowd_get_steering_arrive,
+    WANDER: crowd_get_steering_wander,
+    FOLLOW_PATH: crowd_get_steering_follow_path,
+    SEPARATE: crowd_get_steering_separate,
+    AVOID_COLLISIONS: crowd_get_steering_avoid_collisions,
+}
+
+# Name of a behavior code, for profiling: its kernel's name without the prefix.
+def behavior_name(code):
+    behavior = crowd_steering_behaviors.get(code)
+    return behavior.__name__.removeprefix("crowd_get_steering_") if behavior is not None else f"code {code}"
+
+# Compute steering for the whole crowd, one vectorized call per behavior group; the profiler
+# times each group's call. With an active mask, only those characters are steered; the others
+# keep their current linear and angular values, draw no random numbers and track no paths.
+# Raises ValueError, as move.get_steering does, if a steered character's behavior has no kernel.
+def crowd_get_steering(crowd, linear, angular, profiler=disabled_profiler, active=None):
+    linear[:] = 0
+    angular[:] = 0
+
+    order = np.argsort(crowd.steer, kind='stable')
+    if active is not None:
+        linear[~active] = crowd.linear[~active]
+        angular[~active] = crowd.angular[~active]
+        order = order[active[order]]
+    codes, starts = np.unique(crowd.steer[order], return_index=True)
+    for code, start in zip(codes, starts):
+        if code not in crowd_steering_behaviors:
+            raise ValueError(f"steering behavior {code} is not supported by the crowd engine; mover_id={crowd.id[order[start]]}")
+
+    for code, group in zip(codes, np.split(order, starts[1:])):
+        with profiler.section("steering " + behavior_name(code), len(group)):
+            crowd_steering_behaviors[code](crowd, group, linear, angular)
+
+    return linear, angular
@@ -0,0 +1,171 @@
+# Author: Isaiah Harville
+# Purpose: Sweep steering parameters over a grid, running every variant in one vectorized ensemble.
+
+import csv
+import itertools
+import sys
+import numpy as np
+from src import *
+from Init import init_scenario, stop_velocity, SEEK, ARRIVE, PURSUE, FOLLOW_PATH
+from crowd import Crowd, integer_fields, scalar_fields, vector_fields
+from steering import crowd_get_steering
+
+# Settings that may vary per variant, besides the character fields in crowd.scalar_fields.
+swept_settings = ["delta_time", "stop_time"]
+
+
+# Goal position of each character, and whether it has one: its target for Seek, Arrive and Pursue,
+# and the end of its path for Follow Path.
+def goal_positions(crowd):
+    goals = np.zeros((crowd.count, 2), dtype=np.float64)
+    has_goal = np.isin(crowd.steer, [SEEK, ARRIVE, PURSUE]) & (crowd.target >= 0)
+    goals[has_goal] = crowd.position[crowd.target[has_goal]]
+
+    following = np.flatnonzero(crowd.steer == FOLLOW_PATH)
+    for i in following:
+        path = crowd.paths[crowd.path_to_follow[i] - 1]
+        goals[i] = [path['x'][-1], path['y'][-1]]
+    has_goal[following] = True
+
+    return goals, has_goal
+
+
+# Run every combination of the values in grid (parameter name -> list of values) for one scenario.
+# Each variant is one member of an ensemble crowd, so all variants step together; the crowd's
+# arrays reshaped to (variants, characters, ...) give the ensemble axis. A character has arrived
+# once it is within max(arrive_radius, arrive_tolerance) of its goal.
+# Returns the ensemble crowd's final state and one row per variant: the parameter values,
+# arrival_time (when the last character with a goal first arrived, NaN if one never did),
+# overshoot (the farthest any of them got from its goal after arriving) and collisions
+# (characters that collided).
+def run_sweep(scenario, grid, arrive_tolerance=1.0):
+    settings = init_scenario(scenario)
+    names = list(grid)
+    for name in names:
+        if name not in scalar_fields and name not in swept_settings:
+            raise ValueError(f"cannot sweep {name}")
+
+    variants = list(itertools.product(*[grid[name] for name in names]))
+    base = Crowd.from_characters(settings['Character'], settings['Path'], settings['seed'])
+    crowd = base.tile(len(variants))
+    count = base.count
+
+    # Per-variant settings, one value per ensemble member.
+    delta_time = np.full(len(variants), settings['delta_time'], dtype=np.float64)
+    stop_time = np.full(len(variants), settings['stop_time'], dtype=np.float64)
+    for e, values in enumerate(variants):
+        for name, value in zip(names, values):
+            if name == "delta_time":
+                delta_time[e] = value
+            elif name == "stop_time":
+                stop_time[e] = value
+            else:
+                getattr(crowd, name).reshape(len(variants), count)[e] = value
+
+    linear = np.zeros((crowd.count, 2), dtype=np.float64)
+    angular = np.zeros(crowd.count, dtype=np.float64)
+    times = np.zeros(len(variants), dtype=np.float64)
+    arrived = np.full(crowd.count, np.nan)
+    overshoot = np.zeros(crowd.count, dtype=np.float64)
+
+    # Calculate every variant's trajectory. Finished variants are left out of steering, and their
+    # state is put back after the update and collision check, so each ends as a run on its own would.
+    while (times < stop_time).any():
+        active = times < stop_time
+        step = np.where(active, delta_time, 0)
+        times += step
+
+        stepping = np.repeat(active, count)
+        finished = ~stepping
+        saved = {field: getattr(crowd, field)[finished].copy()
+                 for field in integer_fields + scalar_fields + vector_fields + ["col_collided"]}
+
+        crowd_get_steering(crowd, linear, angular, active=stepping)
+        crowd.update(linear, angular, np.repeat(step, count), settings['physics'], stop_velocity)
+        if settings['check_collisions']:
+            crowd.check_collisions()
+        for field, values in saved.items():
+            getattr(crowd, field)[finished] = values
+
+        goals, has_goal = goal_positions(crowd)
+        distance = magnitudes(crowd.position - goals)
+        current = has_goal & np.repeat(active, count)
+        newly = current & np.isnan(arrived) & (distance <= np.maximum(crowd.arrive_radius, arrive_tolerance))
+        arrived[newly] = np.repeat(times, count)[newly]
+        after = current & ~np.isnan(arrived)
+        overshoot[after] = np.maximum(overshoot[after], distance[after])
+
+    _, has_goal = goal_positions(crowd)
+    rows = []
+    for e, values in enumerate(variants):
+        member = slice(e * count, (e + 1) * count)
+        goal_arrivals = arrived[member][has_goal[member]]
+        rows.append(dict(zip(names, values)))
+        rows[-1]["arrival_time"] = float(goal_arrivals.max()) if len(goal_arrivals) and not np.isnan(goal_arrivals).any() else np.nan
+        rows[-1]["overshoot"] = float(overshoot[member][has_goal[member]].max(initial=0))
+        rows[-1]["collisions"] = int(crowd.col_collided[member].sum())
+
+    return rows, crowd
+
+
+# Print the sweep results as a table, and write them to a CSV file if csv_file is given.
+def print_sweep(rows, csv_file=None):
+    columns = list(rows[0])
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>14.4g}" for column in columns))
+
+    if csv_file:
+        with open(csv_file, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+# Checks that every sweep member ends in the same state as a separate simulate_frames run with
+# the member's settings; returns one result per sweep, as src.support_test does.
+def support_test():
+    from move import simulate_frames
+    results = []
+    sweeps = [
+        (26, {"max_linear": [1, 2], "delta_time": [0.25, 0.5], "stop_time": [20, 50]}),
+        (24, {"wander_rate": [1, 2], "stop_time": [30, 60]}),
+        (27, {"path_offset": [0.02, 0.08], "stop_time": [40, 125]}),
+    ]
+    for scenario, grid in sweeps:
+        rows, crowd = run_sweep(scenario, grid)
+        count = crowd.count // len(rows)
+        matches = []
+        for e, row in enumerate(rows):
+            settings = init_scenario(scenario)
+            for name in grid:
+                if name in swept_settings:
+                    settings[name] = row[name]
+                else:
+                    for character in settings['Character']:
+                        character[name] = row[name]
+            *_, last = simulate_frames(settings)
+            member = slice(e * count, (e + 1) * count)
+            matches.append(all(np.array_equal(getattr(crowd, field)[member], getattr(last, field))
+                               for field in ["position", "velocity", "linear", "orientation", "col_collided"]))
+        results.append(all(matches))
+
+    return results
+
+
+if __name__ == "__main__":
+    # With "test", run the support tests instead of the example sweep.
+    if sys.argv[1:] == ["test"]:
+        results = support_test()
+        for idx, result in enumerate(results):
+            print(f"Test {idx+1} {'PASSED' if result else 'FAILED'}")
+        sys.exit()
+
+    # Example: sweep the path-following scenario's speed and look-ahead.
+    scenario = int(sys.argv[1]) if len(sys.argv) > 1 else 27
+    rows, crowd = run_sweep(scenario, {
+        "max_linear": [1, 2, 4],
+        "path_offset": [0.02, 0.04, 0.08],
+        "delta_time": [0.25, 0.5],
+    })
+    print_sweep(rows, "sweep_results.csv")
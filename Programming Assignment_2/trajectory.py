@@ -0,0 +1,568 @@
+# Author: Isaiah Harville
+# Purpose: Writers and readers for the trajectory files produced by move.py.
+
+import io
+import json
+import os
+import queue
+import struct
+import threading
+import time as clock
+import zlib
+import numpy as np
+
+# Vector fields checked for NaN before a timestep is written.
+checked_fields = ["position", "velocity", "linear"]
+
+
+## Text Trajectory ##
+
+# Buffered writer for the comma-separated trajectory file read by plotter.py.
+# The file stays open for the whole run; each call formats a whole timestep, and the
+# buffer is written out once it holds flush_bytes characters or flush_seconds have passed.
+# The state passed to write_step is anything with the crowd's arrays (id, position, velocity,
+# linear, orientation, steer, col_collided), such as a Crowd.
+# With index=True, a TrajectoryIndexWriter records where each row starts in a sidecar file.
+class TrajectoryWriter:
+    mode = 'w'
+    newline = '' # Rows end in "\n" on every platform, so the index's byte offsets hold on Windows
+    empty = ""
+
+    def __init__(self, filename, flush_bytes=1 << 20, flush_seconds=5.0, index=False):
+        self.filename = filename
+        self.file = open(filename, self.mode, newline=self.newline)
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = clock.monotonic()
+        self.index = TrajectoryIndexWriter(index_filename(filename)) if index else None
+        self.offset = 0 # Bytes formatted so far
+
+
+    # Format one timestep; one row per character, in the column order plotter.py expects.
+    def format_step(self, time, state):
+        for field in checked_fields:
+            values = getattr(state, field)
+            for i in np.flatnonzero(np.isnan(values).any(axis=1)):
+                print(f"NaN detected in {field}:", values[i])
+
+        row = f"{time},%d,%r,%r,%r,%r,%r,%r,%r,%d,%s\n"
+        columns = zip(state.id.tolist(),
+                      state.position[:, 0].tolist(), state.position[:, 1].tolist(),
+                      state.velocity[:, 0].tolist(), state.velocity[:, 1].tolist(),
+                      state.linear[:, 0].tolist(), state.linear[:, 1].tolist(),
+                      state.orientation.tolist(), state.steer.tolist(), state.col_collided.tolist())
+        rows = [row % values for values in columns]
+
+        # Rows are ASCII, so their lengths in characters are their lengths in bytes.
+        if self.index is not None:
+            ends = np.cumsum([len(text) for text in rows]) + self.offset
+            self.index.add_step(time, np.concatenate([[self.offset], ends]))
+            self.offset = int(ends[-1]) if len(ends) else self.offset
+
+        return "".join(rows)
+
+
+    def write_step(self, time, state):
+        text = self.format_step(time, state)
+        self.buffer.append(text)
+        self.buffered += len(text)
+
+        if self.buffered >= self.flush_bytes or clock.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+
+    def flush(self):
+        self.file.write(self.empty.join(self.buffer))
+        self.file.flush()
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = clock.monotonic()
+
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+            if self.index is not None:
+                self.index.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# trajectory_dtype records from a table of trajectory columns, one row per record.
+def trajectory_records(table):
+    records = np.empty(len(table), dtype=trajectory_dtype)
+    records['time'] = table[:, 0]
+    records['id'] = table[:, 1]
+    records['position'] = table[:, 2:4]
+    records['velocity'] = table[:, 4:6]
+    records['linear'] = table[:, 6:8]
+    records['orientation'] = table[:, 8]
+    records['steer'] = table[:, 9]
+    records['col_collided'] = table[:, 10] != 0
+    return records
+
+# Parse trajectory lines into one float table; the booleans become 1 and 0 so every column parses
+# as a number in a single np.loadtxt pass. lines may be any iterable, such as an open file.
+def parse_trajectory_lines(lines):
+    table = np.loadtxt((line.replace("True", "1").replace("False", "0") for line in lines), delimiter=',', ndmin=2)
+    return trajectory_records(table.reshape(-1, 11))
+
+# Parse comma-separated trajectory text, such as the rows an indexed read fetched, into
+# trajectory_dtype records, one per row.
+def parse_trajectory_text(text):
+    if not text.strip():
+        return np.empty(0, dtype=trajectory_dtype)
+    return parse_trajectory_lines(io.StringIO(text))
+
+# Read a whole text trajectory into trajectory_dtype records, one per row, in file order. The file
+# is parsed line by line, so only the parsed table is held in memory, not the file's text.
+def load_text_trajectory(filename):
+    if os.path.getsize(filename) == 0:
+        return np.empty(0, dtype=trajectory_dtype)
+    with open(filename, 'r') as file:
+        return parse_trajectory_lines(file)
+
+# Split trajectory records into one track per character, in the order each character first
+# appears; a stable sort by id keeps each track's rows in time order.
+def character_tracks(records):
+    order = np.argsort(records['id'], kind='stable')
+    _, starts = np.unique(records['id'][order], return_index=True)
+    tracks = np.split(order, starts[1:])
+    first_rows = [track[0] for track in tracks] if len(records) else []
+    return [records[tracks[k]] for k in np.argsort(first_rows, kind='stable')]
+
+
+## Text Trajectory Index ##
+
+# Name of the sidecar index file for a text trajectory.
+def index_filename(filename):
+    return filename + ".idx.npy"
+
+# Sidecar index for a text trajectory: a .npy file with one record per timestep, holding its
+# time and the byte offset where each character's row starts, plus the offset where the
+# timestep ends. Row k of timestep t is bytes offset[t, k] to offset[t, k + 1] of the text file.
+class TrajectoryIndexWriter:
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.dtype = None
+        self.steps = 0
+        self.header_length = 0
+
+    def add_step(self, time, offsets):
+        if self.dtype is None:
+            self.dtype = np.dtype([('time', '<f8'), ('offset', '<i8', (len(offsets),))])
+            self.header_length = len(npy_header((np.iinfo(np.int64).max,), dtype=self.dtype))
+            self.file.write(npy_header((0,), self.header_length, self.dtype))
+
+        record = np.empty(1, dtype=self.dtype)
+        record['time'] = time
+        record['offset'] = offsets
+        self.file.write(record.tobytes())
+        self.steps += 1
+
+    # Rewrite the header with the final number of timesteps.
+    def close(self):
+        if not self.file.closed:
+            if self.dtype is not None:
+                self.file.seek(0)
+                self.file.write(npy_header((self.steps,), self.header_length, self.dtype))
+            self.file.close()
+
+
+# Memory-map a text trajectory's index; returns its per-timestep records.
+def load_trajectory_index(filename):
+    return np.load(index_filename(filename), mmap_mode='r')
+
+# Timesteps of the index between start_time and stop_time, inclusive; None leaves that end open.
+def indexed_steps(index, start_time=None, stop_time=None):
+    first = 0 if start_time is None else int(np.searchsorted(index['time'], start_time, side='left'))
+    last = len(index) if stop_time is None else int(np.searchsorted(index['time'], stop_time, side='right'))
+    return range(first, last)
+
+# Read one character's track from an indexed text trajectory, optionally only between
+# start_time and stop_time; only that character's rows are read. Returns trajectory_dtype
+# records, one per timestep.
+def read_character_track(filename, character_id, start_time=None, stop_time=None):
+    index = load_trajectory_index(filename)
+
+    with open(filename, 'rb') as file:
+        # Character columns follow the order of the first timestep's rows.
+        offsets = index['offset'][0]
+        file.seek(offsets[0])
+        first_step = parse_trajectory_text(file.read(offsets[-1] - offsets[0]).decode())
+        k = np.flatnonzero(first_step['id'] == character_id)
+        if len(k) == 0:
+            raise KeyError(f"character {character_id} is not in {filename}")
+        k = k[0]
+
+        lines = []
+        for t in indexed_steps(index, start_time, stop_time):
+            start, end = index['offset'][t, k], index['offset'][t, k + 1]
+            file.seek(start)
+            lines.append(file.read(end - start).decode())
+
+    return parse_trajectory_text("".join(lines))
+
+# Read every character's rows between start_time and stop_time, inclusive, from an indexed text
+# trajectory; only those timesteps are read. Returns a (timesteps, characters) array of
+# trajectory_dtype records.
+def read_time_slice(filename, start_time=None, stop_time=None):
+    index = load_trajectory_index(filename)
+    steps = indexed_steps(index, start_time, stop_time)
+    if len(steps) == 0:
+        return np.empty((0, index['offset'].shape[1] - 1), dtype=trajectory_dtype)
+
+    with open(filename, 'rb') as file:
+        start, end = index['offset'][steps.start, 0], index['offset'][steps.stop - 1, -1]
+        file.seek(start)
+        records = parse_trajectory_text(file.read(end - start).decode())
+
+    return records.reshape(len(steps), -1)
+
+
+## Binary Trajectory ##
+
+# One record per character per timestep; each field is a typed column of the memory-mapped file.
+trajectory_dtype = np.dtype([
+    ('time', '<f8'),
+    ('id', '<i8'),
+    ('position', '<f8', (2,)),
+    ('velocity', '<f8', (2,)),
+    ('linear', '<f8', (2,)),
+    ('orientation', '<f8'),
+    ('steer', '<i2'),
+    ('col_collided', '?'),
+])
+
+# Build a .npy (version 1.0) header for a timesteps x characters array of trajectory records,
+# or of another dtype, padded with spaces to length bytes so it can be rewritten in place once
+# the run ends.
+def npy_header(shape, length=None, dtype=trajectory_dtype):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(dtype), shape)
+    if length is None:
+        length = -(-(10 + len(header) + 1) // 64) * 64
+    header = header.ljust(length - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + np.uint16(len(header)).astype('<u2').tobytes() + header.encode('latin1')
+
+
+# Binary writer; the output is a standard .npy file of trajectory_dtype records with shape
+# (timesteps, characters), so load_binary_trajectory can memory-map it without parsing.
+class BinaryTrajectoryWriter(TrajectoryWriter):
+    mode = 'wb'
+    newline = None
+    empty = b""
+
+    def __init__(self, filename, flush_bytes=1 << 22, flush_seconds=5.0):
+        super().__init__(filename, flush_bytes, flush_seconds)
+        self.steps = 0
+        self.count = 0
+        self.header_length = len(npy_header((np.iinfo(np.int64).max, np.iinfo(np.int64).max)))
+        self.file.write(npy_header((0, 0), self.header_length))
+
+
+    def format_step(self, time, state):
+        records = np.empty(len(state.id), dtype=trajectory_dtype)
+        records['time'] = time
+        for field in trajectory_dtype.names[1:]:
+            records[field] = getattr(state, field)
+
+        self.steps += 1
+        self.count = len(records)
+        return records.tobytes()
+
+
+    # Flush the records, then rewrite the header with the final number of timesteps.
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.seek(0)
+            self.file.write(npy_header((self.steps, self.count), self.header_length))
+            self.file.close()
+
+
+## Compressed Trajectory ##
+
+# A compressed trajectory is a magic string and a JSON header line, then a stream of blocks.
+# Each block is a 4-byte little-endian length and a zlib-compressed .npz holding chunk_steps
+# timesteps, so a reader can decode one block at a time. Float fields are stored as float32,
+# or, given a tolerance, as integer multiples of 2 * tolerance, so every value is within
+# tolerance of the original. In fixed-point mode, position and velocity are delta-encoded per
+# character: each block keeps its first timestep whole and the differences for the rest.
+compressed_magic = b"TRZ1\n"
+compressed_fields = ["position", "velocity", "linear", "orientation"]
+delta_fields = ["position", "velocity"]
+
+
+# Smallest signed integer type holding every value of an integer array.
+def narrow_integers(values):
+    for dtype in [np.int8, np.int16, np.int32]:
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values
+
+
+class CompressedTrajectoryWriter(TrajectoryWriter):
+    mode = 'wb'
+    newline = None
+    empty = b""
+
+    def __init__(self, filename, tolerance=1e-3, chunk_steps=64, level=6, flush_bytes=1 << 22, flush_seconds=5.0):
+        super().__init__(filename, flush_bytes, flush_seconds)
+        self.tolerance = tolerance
+        self.chunk_steps = chunk_steps
+        self.level = level
+        self.pending = []
+        header = {"tolerance": tolerance, "chunk_steps": chunk_steps, "fields": compressed_fields, "delta": delta_fields if tolerance else []}
+        self.file.write(compressed_magic + json.dumps(header).encode() + b"\n")
+
+
+    # Keep a copy of the timestep; once chunk_steps are kept, they become the next block.
+    def format_step(self, time, state):
+        step = {"time": time, "id": state.id.copy(), "steer": state.steer.copy(), "col_collided": state.col_collided.copy()}
+        for field in compressed_fields:
+            step[field] = getattr(state, field).copy()
+        self.pending.append(step)
+
+        if len(self.pending) < self.chunk_steps:
+            return b""
+        return self.encode_block()
+
+
+    # Encode the kept timesteps as one compressed block.
+    def encode_block(self):
+        steps, self.pending = self.pending, []
+        arrays = {
+            "time": np.array([step["time"] for step in steps], dtype=np.float64),
+            "id": steps[0]["id"],
+            "steer": np.stack([step["steer"] for step in steps]).astype(np.int16),
+            "col_collided": np.stack([step["col_collided"] for step in steps]),
+        }
+
+        for field in compressed_fields:
+            values = np.stack([step[field] for step in steps])
+            if not self.tolerance:
+                arrays[field] = values.astype(np.float32)
+                continue
+
+            quantized = np.rint(values / (2 * self.tolerance)).astype(np.int64)
+            if field in delta_fields:
+                quantized[1:] = np.diff(quantized, axis=0)
+            arrays[field] = narrow_integers(quantized)
+
+        payload = io.BytesIO()
+        np.savez(payload, **arrays)
+        block = zlib.compress(payload.getvalue(), self.level)
+        return struct.pack('<I', len(block)) + block
+
+
+    # Write the last, partial block, then close.
+    def close(self):
+        if not self.file.closed:
+            if self.pending:
+                self.buffer.append(self.encode_block())
+            super().close()
+
+
+# Read a compressed trajectory one block at a time; yields a (timesteps, characters) array of
+# trajectory_dtype records per block, with float fields restored to within the tolerance.
+def read_compressed_trajectory(filename):
+    with open(filename, 'rb') as file:
+        if file.readline() != compressed_magic:
+            raise ValueError(f"{filename} is not a compressed trajectory")
+        header = json.loads(file.readline())
+        tolerance = header["tolerance"]
+
+        while True:
+            length = file.read(4)
+            if len(length) < 4:
+                return
+            arrays = np.load(io.BytesIO(zlib.decompress(file.read(struct.unpack('<I', length)[0]))))
+
+            steps, count = arrays["steer"].shape
+            records = np.empty((steps, count), dtype=trajectory_dtype)
+            records['time'] = arrays["time"][:, None]
+            records['id'] = arrays["id"]
+            records['steer'] = arrays["steer"]
+            records['col_collided'] = arrays["col_collided"]
+
+            for field in header["fields"]:
+                values = arrays[field].astype(np.float64 if tolerance else np.float32)
+                if field in header["delta"]:
+                    values = np.cumsum(values, axis=0)
+                records[field] = values * (2 * tolerance) if tolerance else values
+
+            yield records
+
+# Read a whole compressed trajectory into a (timesteps, characters) array of trajectory_dtype records.
+def load_compressed_trajectory(filename):
+    blocks = list(read_compressed_trajectory(filename))
+    return np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=trajectory_dtype)
+
+
+## Background Writer ##
+
+# Copy of the arrays of a state that the writers read, so the simulation can keep changing the
+# state while the copy waits to be written.
+class StateSnapshot:
+    def __init__(self, state):
+        for field in trajectory_dtype.names[1:]:
+            setattr(self, field, getattr(state, field).copy())
+
+
+# Wrap a trajectory writer so its steps are formatted and written on a background thread.
+# write_step queues a snapshot of the state and returns; once queue_steps snapshots are waiting
+# it blocks until the thread catches up, so memory stays bounded. Once the wrapped writer raises
+# an error, later steps are dropped and the error is raised again from write_step and flush,
+# and from close if it was not raised already.
+class AsyncTrajectoryWriter:
+    def __init__(self, writer, queue_steps=64):
+        self.writer = writer
+        self.filename = writer.filename
+        self.queue = queue.Queue(queue_steps)
+        self.error = None
+        self.reported = False
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="trajectory writer", daemon=True)
+        self.thread.start()
+
+
+    # Write queued steps until the None sent by close; after an error, keep draining the queue
+    # so write_step never blocks on a full queue.
+    def run(self):
+        while True:
+            step = self.queue.get()
+            try:
+                if step is None:
+                    return
+                if self.error is None:
+                    self.writer.write_step(*step)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+
+    def check(self):
+        if self.error is not None:
+            self.reported = True
+            raise self.error
+
+
+    def write_step(self, time, state):
+        self.check()
+        self.queue.put((time, StateSnapshot(state)))
+
+
+    # Wait for every queued step to be written, then flush the wrapped writer.
+    def flush(self):
+        self.queue.join()
+        self.check()
+        self.writer.flush()
+
+
+    # Write the remaining steps, stop the thread and close the wrapped writer.
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            if not self.reported:
+                self.check()
+        finally:
+            self.writer.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Open the writer matching the trajectory file name; .npy files get the binary format and .trz
+# files the compressed format, with tolerance and chunk_steps. index adds a sidecar index to
+# text files; the other formats can already be read a timestep or block at a time. thread
+# writes on a background thread.
+def open_trajectory_writer(filename, index=False, thread=False, tolerance=1e-3, chunk_steps=64, **kwargs):
+    if filename.endswith('.npy'):
+        writer = BinaryTrajectoryWriter(filename, **kwargs)
+    elif filename.endswith('.trz'):
+        writer = CompressedTrajectoryWriter(filename, tolerance, chunk_steps, **kwargs)
+    else:
+        writer = TrajectoryWriter(filename, index=index, **kwargs)
+    return AsyncTrajectoryWriter(writer) if thread else writer
+
+# Memory-map a binary trajectory; returns a read-only timesteps x characters record array,
+# so data['position'][:, k] is character k's track without copying.
+def load_binary_trajectory(filename):
+    return np.load(filename, mmap_mode='r')
+
+
+## Support Tests ##
+
+# Checks the trajectory formats against the states written to them; returns one result per check,
+# as src.support_test does.
+def support_test():
+    import tempfile
+    import types
+
+    results = []
+    rng = np.random.default_rng(330)
+    states = []
+    for step in range(150):
+        states.append(types.SimpleNamespace(id=np.arange(100, 140), position=rng.uniform(-100, 100, (40, 2)), velocity=rng.normal(size=(40, 2)),
+                                            linear=rng.normal(size=(40, 2)), orientation=rng.uniform(0, 2 * np.pi, 40),
+                                            steer=rng.integers(1, 14, 40), col_collided=rng.random(40) < 0.2))
+    times = np.arange(len(states)) * 0.5
+    expected = np.array([trajectory_records(np.column_stack([np.full(40, time), state.id, state.position, state.velocity, state.linear,
+                                                             state.orientation, state.steer, state.col_collided]))
+                         for time, state in zip(times, states)])
+
+    with tempfile.TemporaryDirectory() as directory:
+        def write(filename, **kwargs):
+            with open_trajectory_writer(os.path.join(directory, filename), **kwargs) as writer:
+                for time, state in zip(times, states):
+                    writer.write_step(time, state)
+            return os.path.join(directory, filename)
+
+        # The text and binary formats give back exactly what was written
+        text = write("trajectory.txt", index=True)
+        results.append(np.array_equal(load_text_trajectory(text).reshape(expected.shape), expected))
+        results.append(np.array_equal(load_binary_trajectory(write("trajectory.npy")), expected))
+
+        # The compressed format keeps every float within its tolerance, or float32 precision without one
+        for tolerance in [1e-3, 0]:
+            data = load_compressed_trajectory(write(f"trajectory{tolerance}.trz", tolerance=tolerance, chunk_steps=32))
+            limit = tolerance or 1e-4
+            close = all(np.abs(data[field] - expected[field]).max() <= limit * (1 if tolerance else np.abs(expected[field]).max()) for field in compressed_fields)
+            results.append(close and all(np.array_equal(data[field], expected[field]) for field in ["time", "id", "steer", "col_collided"]))
+
+        # Indexed reads of one character's track and of a time slice match the whole file
+        results.append(np.array_equal(read_character_track(text, 117), expected[:, 17]))
+        results.append(np.array_equal(read_character_track(text, 100, times[40], times[60]), expected[40:61, 0]))
+        results.append(np.array_equal(read_time_slice(text, times[10], times[12]), expected[10:13]))
+        results.append(len(read_time_slice(text, times[-1] + 1)) == 0)
+
+        # The background-thread writer writes the same file
+        with open(text, 'rb') as file, open(write("threaded.txt", thread=True), 'rb') as threaded:
+            results.append(file.read() == threaded.read())
+
+    return results
+
+
+if __name__ == "__main__":
+    # support_test runs only when this script is run directly, and not when imported as a module
+    results = support_test()
+    for idx, result in enumerate(results):
+        print(f"Test {idx+1} {'PASSED' if result else 'FAILED'}")
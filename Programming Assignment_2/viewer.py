@@ -0,0 +1,144 @@
+# Author: Isaiah Harville
+# Purpose: Watch a simulation live; frames stream from move.simulate_frames into a blitted animation.
+
+import sys
+import threading
+import time as clock
+import numpy as np
+from matplotlib import pyplot as plt
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
+from Init import init_scenario, scenario, crowd_engine
+from move import simulate_frames
+from trajectory import StateSnapshot
+
+viewer_interval = 33  # Milliseconds between redraws
+viewer_speed = None  # Simulated seconds per wall-clock second; None runs the simulation as fast as it can
+
+
+# Runs a simulation on a background thread, keeping a copy of only its latest frame. The
+# simulation never waits for the viewer; frames it produces between two redraws are skipped.
+# With speed, the simulation is held back so speed simulated seconds pass per wall-clock second.
+class FrameFeed:
+    def __init__(self, frames, speed=None):
+        self.frames = frames
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.latest = None
+        self.produced = 0 # Frames produced so far
+        self.done = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+        self.thread.start()
+
+
+    def run(self):
+        start = clock.perf_counter()
+        try:
+            for frame in self.frames:
+                if self.speed:
+                    wait = frame.time / self.speed - (clock.perf_counter() - start)
+                    if wait > 0:
+                        clock.sleep(wait)
+
+                snapshot = StateSnapshot(frame)
+                snapshot.time = frame.time
+                with self.lock:
+                    self.latest = snapshot
+                    self.produced += 1
+                self.ready.set()
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done = True
+            self.ready.set()
+
+
+    # The latest frame and the number of frames produced up to it.
+    def current(self):
+        with self.lock:
+            return self.latest, self.produced
+
+
+    # Latest frame for each redraw, ending after the simulation's last frame has been drawn.
+    def redraws(self):
+        self.ready.wait()
+        drawn = 0
+        while True:
+            done = self.done
+            frame, produced = self.current()
+            if self.error is not None:
+                raise self.error
+            if produced != drawn:
+                drawn = produced
+                yield frame, produced
+            elif done:
+                return
+            else:
+                yield None, produced
+
+
+# Segments from each position to position + scale * vector, for a LineCollection.
+def vector_segments(positions, vectors, scale=1.0):
+    return np.stack([positions, positions + scale * vectors], axis=1)
+
+
+# Show a live view of a scenario's settings, as returned by init_scenario. One scatter holds the
+# positions and one LineCollection each holds the velocity, linear and orientation vectors, as
+# plotter.py draws them; only those artists are redrawn on each frame. Frames the simulation
+# produces between redraws, every interval milliseconds, are skipped.
+def run_viewer(settings, speed=viewer_speed, interval=viewer_interval, crowd_engine=crowd_engine):
+    plot_what = settings['plot_what']
+    feed = FrameFeed(simulate_frames(settings, crowd_engine), speed)
+
+    # Setting up graph design
+    figure = plt.figure(edgecolor = 'black', figsize = [10, 10])
+    axes = figure.gca()
+    axes.set_xlim([-100, 100])
+    axes.set_ylim([-100, 100])
+    axes.plot([-100, 100], [0, 0], color = 'lightgrey', linestyle = 'dashed', linewidth = 2)
+    axes.plot([0, 0], [-100, 100], color = 'lightgrey', linestyle = 'dashed', linewidth = 2)
+    axes.set_title('Movement Trajectory', fontsize = 20)
+    axes.set_xlabel('X', fontsize = 20)
+    axes.set_ylabel('Z', fontsize = 20)
+    axes.invert_yaxis()
+
+    if plot_what['paths']:
+        for path in settings['Path']:
+            axes.plot(path['x'], path['y'], color = 'grey', linestyle = 'dashed', linewidth = 0.9)
+
+    # Animated artists; they start empty and are filled from each frame.
+    positions = axes.scatter([], [], s = 12, color = 'red', animated = True)
+    vectors = {}
+    for name, color in [('velocity', 'lime'), ('linear', 'blue'), ('orientation', 'yellow')]:
+        if plot_what[name]:
+            vectors[name] = LineCollection([], colors = color, linewidths = 1, animated = True)
+            axes.add_collection(vectors[name])
+    status = axes.text(0.02, 0.98, "", transform = axes.transAxes, va = 'top', fontsize = 10, animated = True)
+    artists = [positions, *vectors.values(), status]
+
+    def draw(redraw):
+        frame, produced = redraw
+        if frame is None:
+            return artists
+
+        positions.set_offsets(frame.position)
+        if 'velocity' in vectors:
+            vectors['velocity'].set_segments(vector_segments(frame.position, frame.velocity, 2))
+        if 'linear' in vectors:
+            vectors['linear'].set_segments(vector_segments(frame.position, frame.linear))
+        if 'orientation' in vectors:
+            headings = np.column_stack([np.cos(frame.orientation), np.sin(frame.orientation)])
+            vectors['orientation'].set_segments(vector_segments(frame.position, headings))
+        status.set_text(f"t = {frame.time:.2f}  frame {produced}  collided {int(frame.col_collided.sum())}")
+        return artists
+
+    animation = FuncAnimation(figure, draw, frames = feed.redraws, interval = interval, blit = True,
+                              repeat = False, cache_frame_data = False)
+    plt.show()
+    return animation
+
+
+if __name__ == "__main__":
+    run_viewer(init_scenario(int(sys.argv[1]) if len(sys.argv) > 1 else scenario))
@@ -8,23 +8,19 @@ import numpy as np
 from data import *
 from queue import PriorityQueue
 
-# Load the data from text files using functions in data.py
-nodes = load_nodes('Programming Assignment_3/nodes.txt')
-connections = load_connections('Programming Assignment_3/connections.txt')
+# Define the graph from data.py, given the nodes and connections loaded from the text files
+def build_graph(nodes, connections):
+    G = Graph()
 
-# Define the graph from data.py
-G = Graph()
-
-# Add nodes to the graph
-for node_id, node_info in nodes.items():
-    G.add_node(Node(node_id, node_info.x, node_info.z))
+    # Add nodes to the graph
+    for node_id, node_info in nodes.items():
+        G.add_node(Node(node_id, node_info.x, node_info.z))
 
-# Add edges to the graph
-for connection_id, connection_info in connections.items():
-    G.add_edge(connection_info.from_node, connection_info.to_node, connection_info.cost)
+    # Add edges to the graph
+    for connection_id, connection_info in connections.items():
+        G.add_edge(connection_info.from_node, connection_info.to_node, connection_info.cost)
 
-source = 1
-target = 66
+    return G
 
 # A* algorithm
 def astar_path(graph, start, end, heuristic):
@@ -68,8 +64,6 @@ def euclidean_distance(a, b):
     # Extract the x and z attributes from the Nodes
     return np.sqrt((a.x - b.x) ** 2 + (a.z - b.z) ** 2)
 
-path = astar_path(G, source, target, euclidean_distance)
-
 # Plotting the graph
 def plot_graph(nodes, connections, path=None):
     # Create a scatter plot for the nodes
@@ -99,5 +93,15 @@ def plot_graph(nodes, connections, path=None):
     plt.axis('off')
     plt.show()
 
-# Call the function with the nodes, connections, and the path
-plot_graph(nodes, connections, path=path)
+if __name__ == "__main__":
+    # Load the data from text files using functions in data.py
+    nodes = load_nodes('Programming Assignment_3/nodes.txt')
+    connections = load_connections('Programming Assignment_3/connections.txt')
+    G = build_graph(nodes, connections)
+
+    source = 1
+    target = 66
+    path = astar_path(G, source, target, euclidean_distance)
+
+    # Call the function with the nodes, connections, and the path
+    plot_graph(nodes, connections, path=path)
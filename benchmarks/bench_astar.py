@@ -0,0 +1,47 @@
+# Author: Isaiah Harville
+# Purpose: Time A* from Programming Assignment 3 on the Adventure Bay graph and on larger synthetic graphs.
+
+from harness import Results, time_call, load_assignment, root
+
+import os
+import numpy as np
+
+# Synthetic graphs are square grids with this many nodes.
+sizes = [1000, 10000, 100000, 1000000]
+quick_sizes = [1000, 10000]
+
+
+# A side x side grid of nodes about one unit apart, with jittered positions; each node connects to
+# its right and upper neighbors, with the Euclidean distance as cost.
+def make_grid_graph(astar, count, rng):
+    side = int(np.sqrt(count))
+    x = np.repeat(np.arange(side), side) + rng.uniform(-0.25, 0.25, side * side)
+    z = np.tile(np.arange(side), side) + rng.uniform(-0.25, 0.25, side * side)
+
+    graph = astar.Graph()
+    for node_id in range(side * side):
+        graph.add_node(astar.Node(node_id, float(x[node_id]), float(z[node_id])))
+
+    for node_id in range(side * side):
+        for neighbor in [node_id + side, node_id + 1]:
+            if neighbor < side * side and (neighbor != node_id + 1 or neighbor % side):
+                graph.add_edge(node_id, neighbor, float(np.hypot(x[node_id] - x[neighbor], z[node_id] - z[neighbor])))
+
+    return graph, 0, side * side - 1
+
+
+def run(results, quick=False):
+    astar = load_assignment(3, "astar")
+    rng = np.random.default_rng(330)
+
+    directory = os.path.join(root, "Programming Assignment_3")
+    graph = astar.build_graph(astar.load_nodes(os.path.join(directory, "nodes.txt")), astar.load_connections(os.path.join(directory, "connections.txt")))
+    results.record("astar", "astar_path adventure bay", len(graph.nodes), time_call(lambda: astar.astar_path(graph, 1, 66, astar.euclidean_distance)))
+
+    for count in (quick_sizes if quick else sizes):
+        graph, start, end = make_grid_graph(astar, count, rng)
+        results.record("astar", "astar_path grid", len(graph.nodes), time_call(lambda: astar.astar_path(graph, start, end, astar.euclidean_distance), repeat=1, min_time=0))
+
+
+if __name__ == "__main__":
+    run(Results())
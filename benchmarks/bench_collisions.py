@@ -0,0 +1,51 @@
+# Author: Isaiah Harville
+# Purpose: Time the collision check and the batched closest approach across crowd sizes.
+
+from harness import Results, time_call
+
+import numpy as np
+from src import closest_approach_all
+from crowd import Crowd
+
+sizes = [10, 100, 1000, 10000, 100000]
+quick_sizes = [10, 100, 1000]
+
+
+# A crowd spread over a square that grows with its size, so density stays the same.
+def make_crowd(count, rng):
+    side = 10 * np.sqrt(count)
+    crowd = Crowd(count)
+    crowd.position[:] = rng.uniform(-side / 2, side / 2, (count, 2))
+    crowd.velocity[:] = rng.uniform(-2, 2, (count, 2))
+    crowd.col_radius[:] = 0.5
+    crowd.avoid_radius[:] = 2
+    crowd.col_lookahead[:] = 4
+    return crowd
+
+
+# Fields check_collisions changes in place.
+collision_fields = ["position", "velocity", "linear", "rotation", "angular", "steer", "col_collided"]
+
+# Function that puts the crowd's collision fields back as they are now, so every timed
+# check_collisions call resolves the same collisions.
+def restorer(crowd):
+    saved = {field: getattr(crowd, field).copy() for field in collision_fields}
+    def restore():
+        for field, values in saved.items():
+            getattr(crowd, field)[:] = values
+    return restore
+
+
+def run(results, quick=False):
+    rng = np.random.default_rng(330)
+
+    for count in (quick_sizes if quick else sizes):
+        crowd = make_crowd(count, rng)
+        results.record("collisions", "check_collisions", count, time_call(crowd.check_collisions, setup=restorer(crowd)))
+
+        crowd = make_crowd(count, rng)
+        results.record("collisions", "closest_approach_all", count, time_call(lambda: closest_approach_all(crowd.position, crowd.velocity, crowd.avoid_radius, crowd.col_lookahead)))
+
+
+if __name__ == "__main__":
+    run(Results())
@@ -0,0 +1,21 @@
+# Author: Isaiah Harville
+# Purpose: Time the Programming Assignment 4 state machine loop across iteration counts.
+
+from harness import Results, time_call, load_assignment
+
+import random
+
+sizes = [1000, 10000, 100000, 1000000]
+quick_sizes = [1000, 10000]
+
+
+def run(results, quick=False):
+    fsm = load_assignment(4, "fsm")
+    random.seed(330)
+
+    for iterations in (quick_sizes if quick else sizes):
+        results.record("fsm", "run_state_machine", iterations, time_call(lambda: fsm.run_state_machine(iterations, fsm.transition_probability), repeat=1 if iterations >= 1000000 else 3))
+
+
+if __name__ == "__main__":
+    run(Results())
@@ -0,0 +1,31 @@
+# Author: Isaiah Harville
+# Purpose: Time the NumPy geometry helpers in src.py against their Vec2 fast path versions.
+
+from harness import Results, time_call
+
+import numpy as np
+from src import *
+
+
+# Time each helper in both versions, per call.
+def run(results, quick=False):
+    Q, A, B = np.array([-3.0, -1.0]), np.array([-8.0, 1.0]), np.array([-4.0, 0.0])
+    Qv, Av, Bv = Vec2.of(Q), Vec2.of(A), Vec2.of(B)
+    path = createPath(1, [0, 35, 90, 35, 0], [0, 25, 30, 25, 0])
+
+    cases = [
+        ("magnitude", magnitude, (Q,), Vec2.magnitude, (Qv,)),
+        ("normalize", normalize, (Q,), Vec2.normalize, (Qv,)),
+        ("distancePntToPnt", distancePntToPnt, (Q, A), Vec2.distance, (Qv, Av)),
+        ("closestPointLine", closestPointLine, (Q, A, B), closestPointLineVec2, (Qv, Av, Bv)),
+        ("closestPointSegment", closestPointSegment, (Q, A, B), closestPointSegmentVec2, (Qv, Av, Bv)),
+        ("getPathParam", getPathParam, (path, Q), getPathParamVec2, (path, Q)),
+    ]
+
+    for name, numpy_function, numpy_args, vec2_function, vec2_args in cases:
+        results.record("geometry", name, 1, time_call(lambda: numpy_function(*numpy_args)))
+        results.record("geometry", name + " vec2", 1, time_call(lambda: vec2_function(*vec2_args)))
+
+
+if __name__ == "__main__":
+    run(Results())
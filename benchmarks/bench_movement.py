@@ -0,0 +1,83 @@
+# Author: Isaiah Harville
+# Purpose: Time dynamic_update, the steering behaviors and the crowd engine's update across crowd sizes.
+
+from harness import Results, time_call
+
+import numpy as np
+from Init import character0, copyCharacter, CONTINUE, STOP, SEEK, FLEE, ARRIVE, WANDER, FOLLOW_PATH, SEPARATE, AVOID_COLLISIONS
+from src import createPath, characterGenerator
+from crowd import Crowd
+from steering import crowd_steering_behaviors, behavior_name
+from move import get_steering, dynamic_update, prepare_mover
+
+sizes = [10, 100, 1000, 10000, 100000]
+quick_sizes = [10, 100, 1000]
+
+# Behaviors timed in both engines.
+behaviors = [CONTINUE, STOP, SEEK, FLEE, ARRIVE, WANDER, FOLLOW_PATH, SEPARATE, AVOID_COLLISIONS]
+
+
+# Characters spread over a square that grows with their number, so density stays the same; each
+# one has movement limits for every behavior and the next character as its target.
+def make_characters(count, steer, seed=330):
+    rng = np.random.default_rng(seed)
+    side = 10 * np.sqrt(count)
+    characters = []
+    for i in range(count):
+        character = copyCharacter(character0)
+        character.update({
+            "id": i, "steer": steer,
+            "position": rng.uniform(-side / 2, side / 2, 2), "velocity": rng.uniform(-2, 2, 2),
+            "orientation": rng.uniform(0, 2 * np.pi),
+            "max_velocity": 4, "max_linear": 2, "max_rotation": 1, "max_angular": 2,
+            "arrive_radius": 1, "arrive_slow": 10, "arrive_time": 1,
+            "align_radius": 0.02, "align_slow": 0.5, "align_time": 0.5,
+            "avoid_radius": 2, "col_radius": 0.5, "col_lookahead": 4,
+            "wander_offset": 8, "wander_radius": 4, "wander_rate": 1,
+            "path_to_follow": 1, "path_offset": 0.04,
+            "sep_threshold": 10, "sep_decay": 50
+        })
+        characters.append(prepare_mover(character))
+
+    for i, character in enumerate(characters):
+        character['target'] = characters[(i + 1) % count]
+        character['random'] = characterGenerator(seed, i)
+    return characters
+
+
+# Path the followers follow, across the middle of the characters' square.
+def make_path(count):
+    side = 10 * np.sqrt(count)
+    x = np.linspace(-side / 2, side / 2, 50)
+    return createPath(1, x, side / 4 * np.sin(x / side * 2 * np.pi))
+
+
+def run(results, quick=False):
+    # Per-character engine: one steering call and one dynamic_update, per call.
+    characters = make_characters(100, CONTINUE)
+    Path = [make_path(100)]
+    for steer in behaviors:
+        for character in characters:
+            character['steer'] = steer
+        results.record("movement", "get_steering " + behavior_name(steer), 1, time_call(lambda: get_steering(characters[0], Path, characters)))
+
+    steering = get_steering(characters[0], Path, characters)
+    results.record("movement", "dynamic_update", 1, time_call(lambda: dynamic_update(characters[0], steering, 0.5, False)))
+
+    # Crowd engine: one call for the whole crowd.
+    for count in (quick_sizes if quick else sizes):
+        crowd = Crowd.from_characters(make_characters(count, CONTINUE), [make_path(count)])
+        linear = np.zeros((count, 2), dtype=np.float64)
+        angular = np.zeros(count, dtype=np.float64)
+        group = np.arange(count)
+
+        for steer in behaviors:
+            kernel = crowd_steering_behaviors[steer]
+            crowd.steer[:] = steer
+            results.record("movement", "crowd " + behavior_name(steer), count, time_call(lambda: kernel(crowd, group, linear, angular)))
+
+        results.record("movement", "crowd update", count, time_call(lambda: crowd.update(linear, angular, 0.5, False)))
+
+
+if __name__ == "__main__":
+    run(Results())
@@ -0,0 +1,46 @@
+# Author: Isaiah Harville
+# Purpose: Time the path queries used by path following across path lengths.
+
+from harness import Results, time_call
+
+import numpy as np
+from src import *
+
+sizes = [10, 100, 1000, 10000]
+quick_sizes = [10, 100, 1000]
+
+# Followers for the batched queries.
+followers = 1000
+
+
+# A winding path with the given number of segments, about one unit per segment.
+def make_path(segments):
+    t = np.linspace(0, 1, segments + 1)
+    return createPath(1, segments * t, 0.1 * segments * np.sin(8 * np.pi * t))
+
+
+def run(results, quick=False):
+    rng = np.random.default_rng(330)
+
+    for segments in (quick_sizes if quick else sizes):
+        path = make_path(segments)
+        position = path['vertices'][segments // 2] + [0.3, 0.2]
+        positions = path['vertices'][rng.integers(0, segments, followers)] + rng.normal(size=(followers, 2))
+        params = rng.uniform(0, 1, followers)
+        segment, _ = closestPathPoint(path, position)
+        last_segments, _ = closestPathPoints(path, positions)
+        windows = np.full(followers, 2)
+
+        results.record("paths", "createPath", segments, time_call(lambda: make_path(segments)))
+        results.record("paths", "getPathParam", segments, time_call(lambda: getPathParam(path, position)))
+        results.record("paths", "getPathParamVec2", segments, time_call(lambda: getPathParamVec2(path, position)))
+        results.record("paths", "trackPathParam", segments, time_call(lambda: trackPathParam(path, position, segment, 2)))
+        results.record("paths", "trackPathParamVec2", segments, time_call(lambda: trackPathParamVec2(path, position, segment, 2)))
+        results.record("paths", "getPathPosition", segments, time_call(lambda: getPathPosition(path, 0.5)))
+        results.record("paths", f"getPathParams x{followers}", segments, time_call(lambda: getPathParams(path, positions)))
+        results.record("paths", f"trackPathParams x{followers}", segments, time_call(lambda: trackPathParams(path, positions, last_segments, windows)))
+        results.record("paths", f"getPathPositions x{followers}", segments, time_call(lambda: getPathPositions(path, params)))
+
+
+if __name__ == "__main__":
+    run(Results())
@@ -0,0 +1,48 @@
+# Author: Isaiah Harville
+# Purpose: Compare two stored benchmark runs, such as two commits, and flag regressions.
+# Usage: python benchmarks/compare_benchmarks.py OLD NEW [threshold]
+# OLD and NEW are result files or commit ids in benchmarks/results.
+
+import json
+import os
+import sys
+from harness import results_dir
+
+
+# Load a result file, given its name or the commit it was stored under.
+def load_results(name):
+    filename = name if os.path.exists(name) else os.path.join(results_dir, f"{name}.json")
+    with open(filename) as file:
+        return json.load(file)
+
+
+# Print the ratio of new to old time for every benchmark in both runs; ratios above 1 + threshold
+# are marked as regressions. Returns the number of regressions.
+def compare(old, new, threshold=0.1):
+    old_times = {(row["suite"], row["name"], row["size"]): row["seconds"] for row in old["results"]}
+    regressions = 0
+
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'suite':<12}{'name':<36}{'size':>10}{'old us':>14}{'new us':>14}{'ratio':>8}")
+    for row in new["results"]:
+        key = (row["suite"], row["name"], row["size"])
+        if key not in old_times:
+            continue
+
+        ratio = row["seconds"] / old_times[key]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  slower"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{row['suite']:<12}{row['name']:<36}{row['size']:>10}{old_times[key] * 1e6:>14.3f}{row['seconds'] * 1e6:>14.3f}{ratio:>8.2f}{flag}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    regressions = compare(load_results(sys.argv[1]), load_results(sys.argv[2]), threshold)
+    print(f"{regressions} regressions over {threshold:.0%}")
+    sys.exit(1 if regressions else 0)
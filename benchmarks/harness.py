@@ -0,0 +1,92 @@
+# Author: Isaiah Harville
+# Purpose: Shared timing, module loading and result storage for the benchmark suites.
+
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# The movement modules import each other by name, so Programming Assignment_2 goes on the path.
+sys.path.insert(0, os.path.join(root, "Programming Assignment_2"))
+
+
+# Import an assignment's main.py under its own module name; each assignment has a main.py, and
+# the assignment's directory goes on the path for its other modules.
+def load_assignment(assignment, name):
+    directory = os.path.join(root, f"Programming Assignment_{assignment}")
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Seconds per call of function, best of repeat timings; each timing makes enough calls to run
+# for at least min_time seconds. setup, if given, runs before every call, outside the timed part,
+# for functions that change the data they work on; each call is then timed on its own.
+def time_call(function, repeat=3, min_time=0.05, setup=None):
+    if setup is not None:
+        best = float("inf")
+        for _ in range(repeat):
+            elapsed, calls = 0.0, 0
+            while calls == 0 or elapsed < min_time:
+                setup()
+                start = time.perf_counter()
+                function()
+                elapsed += time.perf_counter() - start
+                calls += 1
+            best = min(best, elapsed / calls)
+        return best
+
+    number = 1
+    while True:
+        elapsed = timeit.timeit(function, number=number)
+        if elapsed >= min_time:
+            break
+        number *= max(2, min(100, int(min_time / max(elapsed, 1e-9))))
+
+    return min([elapsed] + timeit.repeat(function, number=number, repeat=repeat - 1)) / number
+
+
+# Current commit of the repository, with "-dirty" when there are uncommitted changes.
+def commit_id():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Collects one row per timing and prints it as it goes.
+class Results:
+    def __init__(self):
+        self.rows = []
+
+    def record(self, suite, name, size, seconds):
+        self.rows.append({"suite": suite, "name": name, "size": size, "seconds": seconds})
+        print(f"{suite:<12}{name:<36}{size:>10}{seconds * 1e6:>16.3f} us")
+
+    # Write the results to results/<commit>.json, with the machine they ran on; returns the file name.
+    def save(self, directory=results_dir):
+        os.makedirs(directory, exist_ok=True)
+        commit = commit_id()
+        filename = os.path.join(directory, f"{commit}.json")
+        with open(filename, 'w') as file:
+            json.dump({
+                "commit": commit,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "results": self.rows
+            }, file, indent=2)
+        return filename
@@ -0,0 +1,34 @@
+# Author: Isaiah Harville
+# Purpose: Run every benchmark suite and store the results under the current commit.
+# Usage: python benchmarks/run_benchmarks.py [--quick] [suite ...]
+
+import sys
+from harness import Results
+
+import bench_geometry
+import bench_movement
+import bench_paths
+import bench_collisions
+import bench_astar
+import bench_fsm
+
+suites = {
+    "geometry": bench_geometry,
+    "movement": bench_movement,
+    "paths": bench_paths,
+    "collisions": bench_collisions,
+    "astar": bench_astar,
+    "fsm": bench_fsm,
+}
+
+
+if __name__ == "__main__":
+    # --quick runs only the smaller sizes; suite names pick which suites run, all by default.
+    quick = "--quick" in sys.argv
+    names = [arg for arg in sys.argv[1:] if arg != "--quick"] or list(suites)
+
+    results = Results()
+    for name in names:
+        suites[name].run(results, quick)
+
+    print("results written to", results.save())